@@ -0,0 +1,180 @@
+import math
+import os
+import threading
+import time
+from typing import Optional, Tuple
+import numpy as np
+
+# Inverted-file (IVF) approximate search over a VectorIndex matrix.
+# Rows are clustered with spherical k-means (on a sample); each row is filed
+# under its nearest centroid. A query scores the centroids, opens the `nprobe`
+# best lists and ranks only their rows exactly, so cost grows with
+# nprobe * n / nlist instead of n. Rows added after the lists were built are
+# assigned on insert and kept in a small unsorted tail that is always scanned
+# exactly; the lists are rebuilt once the tail grows, and the centroids are
+# retrained when the index has grown well past the size they were trained on.
+# Training (k-means + filing every row) runs in a background thread started by
+# sync(): until the first training finishes, ready is False and VectorIndex
+# keeps answering exactly; during a retrain the old lists keep serving.
+#
+# Knobs (per index, defaults from env): nlist (0 = ~sqrt(n)), nprobe (higher =
+# better recall, slower), min_rows (below this, search stays exact).
+
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "20000"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+
+def kmeans(sample: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit rows; returns k unit centroids (float32)."""
+    rng = np.random.default_rng(seed)
+    n = sample.shape[0]
+    cent = sample[rng.choice(n, size=k, replace=n < k)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ cent.T, axis=1)
+        sums = np.zeros_like(cent)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random sample rows
+            sums[empty] = sample[rng.choice(n, size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        np.divide(sums, norms, out=sums, where=norms > 0)
+        cent = sums
+    return cent.astype(np.float32, copy=False)
+
+
+def _nearest(mat: np.ndarray, start: int, centroids: np.ndarray) -> np.ndarray:
+    """Nearest-centroid list of rows mat[start:] (in blocks, to bound memory)."""
+    parts = [np.zeros(0, dtype=np.int32)]
+    for i in range(start, mat.shape[0], 8192):
+        parts.append(np.argmax(mat[i : i + 8192] @ centroids.T, axis=1).astype(np.int32))
+    return np.concatenate(parts)
+
+
+class IVFIndex:
+    """Cluster lists over the rows of an external, append-only matrix."""
+
+    def __init__(self, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE, min_rows: int = ANN_MIN_ROWS,
+                 sample_per_list: int = 40, seed: int = 0, background: bool = True):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+        self.background = background
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self._assign = np.zeros(0, dtype=np.int32)  # row -> list; capacity grows geometrically
+        self._count = 0  # rows assigned so far
+        self._order = np.zeros(0, dtype=np.int64)  # rows grouped by list (rows < _listed)
+        self._starts = np.zeros(1, dtype=np.int64)  # list l = _order[_starts[l]:_starts[l + 1]]
+        self._listed = 0
+        self._trainer: Optional[threading.Thread] = None
+        # Guards the list state; training itself runs without it
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def ready(self) -> bool:
+        """True once centroids exist (searches before that should be exact)."""
+        return self.centroids is not None
+
+    @property
+    def training(self) -> bool:
+        return self._trainer is not None and self._trainer.is_alive()
+
+    def train(self, mat: np.ndarray):
+        """(Re)cluster all rows of `mat` and rebuild the lists (blocking)."""
+        t0 = time.perf_counter()
+        n = mat.shape[0]
+        k = self.nlist or max(1, int(math.sqrt(n)))
+        k = min(k, n)
+        rng = np.random.default_rng(self.seed)
+        take = min(n, k * self.sample_per_list)
+        sample = np.asarray(mat[np.sort(rng.choice(n, size=take, replace=False))], dtype=np.float32)
+        centroids = kmeans(sample, k, seed=self.seed)
+        assign = _nearest(mat, 0, centroids)
+        with self._lock:
+            self.centroids = centroids
+            self.trained_rows = n
+            self._assign = assign
+            self._count = n
+            self._rebuild_locked()
+        print(f"IVF trained: {n} rows, {k} lists in {time.perf_counter() - t0:.2f}s")
+
+    def _train_quietly(self, mat: np.ndarray):
+        try:
+            self.train(mat)
+        except Exception as e:
+            print("IVF training error:", str(e))
+
+    def _add_locked(self, mat: np.ndarray):
+        """File rows mat[len(self):] under their nearest centroid."""
+        new = _nearest(mat, self._count, self.centroids)
+        need = self._count + new.shape[0]
+        if need > self._assign.shape[0]:
+            grown = np.zeros(max(need, 2 * self._assign.shape[0], 1024), dtype=np.int32)
+            grown[: self._count] = self._assign[: self._count]
+            self._assign = grown
+        self._assign[self._count : need] = new
+        self._count = need
+
+    def _rebuild_locked(self):
+        """Regroup every assigned row into the sorted lists (tail becomes empty)."""
+        assign = self._assign[: self._count]
+        self._order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.centroids.shape[0])
+        self._starts = np.concatenate(([0], np.cumsum(counts)))
+        self._listed = self._count
+
+    def needs_training(self, n: int) -> bool:
+        return (n >= self.min_rows and not self.training
+                and (self.centroids is None or n > 4 * self.trained_rows))
+
+    def sync(self, mat: np.ndarray):
+        """Catch up with rows appended to `mat` since the last call; starts a
+        (re)training when due. Rows appended meanwhile are filed afterwards.
+        """
+        n = mat.shape[0]
+        if self.needs_training(n):
+            if not self.background:
+                self.train(mat)
+                return
+            # Rows < n never change, so the thread can read this view safely
+            self._trainer = threading.Thread(target=self._train_quietly, args=(mat,), name="ivf-train", daemon=True)
+            self._trainer.start()
+        with self._lock:
+            if self.centroids is None:
+                return
+            if n > self._count:
+                self._add_locked(mat)
+            if self._count - self._listed > max(1024, self._listed // 64):
+                self._rebuild_locked()
+
+    def candidates(self, q: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Row ids in the nprobe lists closest to q, plus the unlisted tail."""
+        with self._lock:
+            nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+            cs = self.centroids @ q
+            lists = np.argpartition(-cs, nprobe - 1)[:nprobe] if nprobe < cs.shape[0] else np.arange(cs.shape[0])
+            parts = [self._order[self._starts[l] : self._starts[l + 1]] for l in lists]
+            parts.append(np.arange(self._listed, self._count, dtype=np.int64))
+        return np.concatenate(parts)
+
+    def search(self, mat: np.ndarray, q: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k (scores, rows) for a unit query, best first."""
+        rows = self.candidates(q, nprobe)
+        if rows.shape[0] < k:
+            # Too few candidates to fill k: fall back to exact
+            rows = np.arange(mat.shape[0])
+        scores = mat[rows] @ q
+        if k < rows.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(rows.shape[0])
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], rows[top]
@@ -1,14 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from summarize import summarize_text
-import fitz  # PyMuPDF
+from summarize import summarize_text, summary_config
 from dotenv import load_dotenv
 import os
 import re
-import math
-import requests
-from typing import List, Dict, Any
+import hashlib
+import json
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote_plus
+from itertools import zip_longest
+from doc_store import Document, DocumentStore
+from index_files import load_document, save_document
+from jobs import IngestError, Job, JobManager
+from references import ReferenceFetcher
+from pdf_extract import default_extractor, filter_noise_pages, spool_upload
+from chunker import chunk_spans, content_spans, normalize_text
+from lexical_index import rrf
+from context_budget import Candidate, ContextStats, budget_context
+from embeddings import API_BASE, EmbeddingEngine
+from http_client import shared_session
+from embedding_cache import cache_from_env
+from singleflight import SingleFlight
+from response_cache import response_cache_from_env, response_key
+from learn_search import LinkCache, LinkSearch
+from reindex import VectorReuse
+import metrics
 
 # Simple Flask backend that:
 # 1) Extracts text from an uploaded PDF/TXT
@@ -19,153 +38,244 @@ from urllib.parse import quote_plus
 load_dotenv()  # pull in GEMINI_API_KEY from backend/.env
 
 app = Flask(__name__)
-CORS(app)  # allow frontend (Vite dev server) to call our API during dev
+CORS(app, expose_headers=["X-Trace-Id"])  # allow frontend (Vite dev server) to call our API during dev
 
 
 # -----------------------
-# RAG In-Memory State
+# RAG Document Store
 # -----------------------
-# Holds the most recently uploaded paper and optional referenced docs
-# (This is intentionally simple and in-memory. If you restart the server, you
-#  need to upload again. Could be swapped for a persistent store.)
-RAG_STATE = {
-    "chunks": [],            # List[str]
-    "embeddings": [],        # List[List[float]]
-    "metas": [],             # List[Dict]
-    "paper_text": "",        # Full text of uploaded paper
-}
+# Each uploaded paper gets a doc_id with its own chunks/embeddings/metas, so
+# concurrent uploads don't clobber each other and /api/ask can search one
+# paper or a workspace of several. Idle documents are evicted from memory;
+# finished indexes are also written to INDEX_DIR and memory-mapped back on
+# demand, so they survive restarts and are shared across workers.
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(os.path.dirname(__file__), ".cache", "index"))
+DOCS = DocumentStore(
+    max_bytes=int(os.getenv("DOC_STORE_MAX_MB", "512")) * 1024 * 1024,
+    idle_ttl=float(os.getenv("DOC_IDLE_SECONDS", "3600")),
+    loader=(lambda doc_id: load_document(doc_id, INDEX_DIR)) if INDEX_DIR else None,
+)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # used for embeddings + generation
 USER_AGENT = os.getenv("USER_AGENT", "RooRAG/1.0 (+https://example.com)")
+# DuckDuckGo endpoints (overridable to point Learn More at a local stub)
+DDG_INSTANT_URL = os.getenv("DDG_INSTANT_URL", "https://api.duckduckgo.com/")
+DDG_HTML_URL = os.getenv("DDG_HTML_URL", "https://duckduckgo.com/html/")
 
 # Google Generative Language API endpoints (Gemini)
-EMBEDDING_MODEL_ENDPOINT = (
-    "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
+ASK_MODEL = "gemini-1.5-flash"
+GENERATE_ENDPOINT = f"{API_BASE}/models/{ASK_MODEL}:generateContent"
+STREAM_ENDPOINT = f"{API_BASE}/models/{ASK_MODEL}:streamGenerateContent?alt=sse"
+# Chunk sizing: "chars" (1200-char windows) or "tokens" (CHUNK_TOKENS per window)
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "300"))
+# Character chunks: "content" (cut points chosen by the text, so a revised
+# upload re-embeds only the chunks around its edits) or "fixed" windows
+CHUNK_BOUNDARIES = os.getenv("CHUNK_BOUNDARIES", "content")
+
+# Retrieval: "hybrid" (BM25 + embeddings, fused), "lexical" (BM25 only, fully
+# offline for queries) or "dense" (embeddings only)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Prompt context: retrieved sources are merged/deduplicated and packed into
+# this many (estimated) input tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_STATS = ContextStats()
+
+# Uploads are indexed in blocks of this many characters as PDF pages stream in
+INDEX_BLOCK_CHARS = int(os.getenv("INDEX_BLOCK_CHARS", "200000"))
+
+# Reference augmentation: concurrent fetches under one deadline, cached by URL/DOI
+REF_MAX = int(os.getenv("REF_MAX", "3"))
+REF_DEADLINE = float(os.getenv("REF_DEADLINE", "30"))
+REFS = ReferenceFetcher(USER_AGENT, max_workers=int(os.getenv("REF_CONCURRENCY", "8")))
+
+# Background ingestion (upload -> job id -> poll /api/jobs/<id>)
+JOBS = JobManager(max_workers=int(os.getenv("INGEST_WORKERS", "2")))
+# doc_ids whose ingest (references and persisting included) hasn't finished;
+# a revision of one of them is refused so versions never race each other
+_INGESTING = set()
+_INGESTING_LOCK = threading.Lock()
+
+# Batched/concurrent embedding client shared by indexing and queries; the
+# persistent cache means re-uploads only pay for chunks we haven't seen.
+EMBED_CACHE = cache_from_env()
+EMBEDDER = EmbeddingEngine(GEMINI_API_KEY, cache=EMBED_CACHE)
+
+# Finished summaries/answers keyed by document fingerprint + prompt + model
+# config (memory LRU over SQLite), so repeat uploads and repeat questions
+# skip the model entirely.
+RESPONSES = response_cache_from_env()
+# Concurrent identical /api/ask requests share one retrieval + generation
+ASK_INFLIGHT = SingleFlight()
+
+# Learn More: Instant Answer and HTML search hedged (the HTML page is asked
+# LEARN_HEDGE_SECONDS later unless the first already had enough links),
+# cached per normalized query
+LEARN_MAX_RESULTS = 5
+LEARN_HEDGE_SECONDS = float(os.getenv("LEARN_HEDGE_SECONDS", "1.0"))
+LEARN_DEADLINE = float(os.getenv("LEARN_DEADLINE", "20"))
+LEARN_BATCH_MAX = int(os.getenv("LEARN_BATCH_MAX", "20"))
+LEARN_CACHE = LinkCache(
+    max_entries=int(os.getenv("LEARN_CACHE_MAX_ENTRIES", "2000")),
+    ttl=float(os.getenv("LEARN_CACHE_TTL", "21600")),
 )
-GENERATE_ENDPOINT = (
-    "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+LEARN = LinkSearch(
+    [
+        lambda q: _ddg_instant_answer(q, max_results=LEARN_MAX_RESULTS),
+        lambda q: _ddg_html_search(q, max_results=LEARN_MAX_RESULTS * 2),
+    ],
+    max_results=LEARN_MAX_RESULTS,
+    hedge_delay=LEARN_HEDGE_SECONDS,
+    deadline=LEARN_DEADLINE,
+    cache=LEARN_CACHE,
 )
 
 
+@app.before_request
+def _start_request():
+    # Optional trace ID: the client's X-Trace-Id, or a fresh one, echoed back
+    g.trace_id = metrics.start_trace(request.headers.get("X-Trace-Id"))
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _finish_request(response):
+    if g.get("trace_id"):
+        response.headers["X-Trace-Id"] = g.trace_id
+    if metrics.ENABLED and request.url_rule is not None and "started" in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.started, request.url_rule.rule, str(response.status_code))
+    return response
+
+
 @app.route("/api/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"})
+    return jsonify(_health_stats())
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text format: stage/request/upstream histograms and counters."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@metrics.collector
+def _gauges():
+    docs = DOCS.stats()
+    out = [
+        ("roorag_documents", "Documents resident in memory.", docs["documents"]),
+        ("roorag_document_chunks", "Chunks (= vectors) in resident documents.", docs["chunks"]),
+        ("roorag_document_bytes", "Private bytes held by resident documents.", docs["bytes"]),
+        ("roorag_learn_cache_hit_ratio", "Learn More cache hit rate.", LEARN_CACHE.stats()["hit_rate"]),
+    ]
+    if EMBED_CACHE:
+        out.append(("roorag_embedding_cache_hit_ratio", "Embedding cache hit rate.", EMBED_CACHE.stats()["hit_rate"]))
+    if RESPONSES:
+        out.append(("roorag_response_cache_hit_ratio", "Response cache hit rate.", RESPONSES.stats()["hit_rate"]))
+    return out
+
+
+def _health_stats() -> Dict[str, Any]:
+    return {
+        "status": "ok",
+        "embedding_cache": EMBED_CACHE.stats() if EMBED_CACHE else None,
+        "documents": DOCS.stats(),
+        "reference_cache": REFS.cache.stats(),
+        "response_cache": RESPONSES.stats() if RESPONSES else None,
+        "query_embeddings": EMBEDDER.query_stats(),
+        "ask_coalescing": ASK_INFLIGHT.stats(),
+        "context_tokens": CONTEXT_STATS.stats(),
+        "learn": LEARN.stats(),
+    }
 
 
-def _chunk_text(text: str, max_chars: int = 1200, overlap: int = 120) -> List[str]:
-    """Split a long string into overlapping windows to index for retrieval.
-    Roughly tries to end on sentence boundaries so chunks read nicely.
+def _chunk_spans(norm: str, max_chars: int = 1200, overlap: int = 120) -> List[Tuple[int, int]]:
+    """Overlapping (start, end) windows over normalized text to index for retrieval.
+    Ends on sentence boundaries where possible so chunks read nicely; by
+    default the cut points are content-defined (max_chars/2 to max_chars long).
+    With CHUNK_UNIT=tokens, fixed windows are sized in approximate tokens instead.
     """
-    text = re.sub(r"\s+", " ", text).strip()
-    chunks = []
-    i = 0
-    n = len(text)
-    while i < n:
-        end = min(i + max_chars, n)
-        # try to break at sentence boundary
-        window = text[i:end]
-        if end < n:
-            m = re.search(r"[.!?]\s+[^.!?]{0,80}$", window)
-            if m:
-                end = i + m.end()
-        chunks.append(text[i:end].strip())
-        i = max(end - overlap, i + 1)
-    return [c for c in chunks if c]
+    if CHUNK_UNIT == "tokens":
+        return chunk_spans(norm, CHUNK_TOKENS, CHUNK_TOKENS // 10, unit="tokens")
+    if CHUNK_BOUNDARIES == "fixed":
+        return chunk_spans(norm, max_chars, overlap)
+    return content_spans(norm, max_chars, max_chars // 2, overlap)
 
 
 def _embed_text(text: str) -> List[float]:
-    """Call Gemini embeddings to convert text -> vector. Returns [] on error."""
-    if not GEMINI_API_KEY:
-        return []
-    headers = {"Content-Type": "application/json", "X-Goog-Api-Key": GEMINI_API_KEY}
-    payload = {
-        "model": "models/text-embedding-004",
-        "content": {"parts": [{"text": text[:6000]}]},
-    }
-    try:
-        r = requests.post(EMBEDDING_MODEL_ENDPOINT, headers=headers, json=payload, timeout=60)
-        r.raise_for_status()
-        data = r.json()
-        vec = data.get("embedding", {}).get("values") or data.get("embeddings", [{}])[0].get("values")
-        return vec or []
-    except Exception as e:
-        print("Embedding error:", str(e))
-        return []
+    """Call Gemini embeddings to convert text -> vector. Returns [] on error.
+    Used for questions: repeats hit an in-process LRU and concurrent
+    duplicates share one request.
+    """
+    return EMBEDDER.embed_query(text)
 
 
-def _cosine(a: List[float], b: List[float]) -> float:
-    """Cosine similarity between two embedding vectors."""
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+def _embed_texts(texts: List[str], progress=None) -> List[List[float]]:
+    """Embed many chunks with batched, concurrent requests (order preserved)."""
+    return EMBEDDER.embed(texts, progress=progress)
 
 
-def _search_similar(question: str, k: int = 5):
-    """Retrieve top-k chunks for a question.
-    If embeddings look weak (e.g., all tiny scores), fall back to paper-first
-    chunks so the model always sees real content from the uploaded doc.
-    """
-    # Robust retrieval with fallback favoring the uploaded paper
-    qvec = _embed_text(question)
+def _dense_ranking(docs: List[Document], qvec: List[float], n: int) -> List[Tuple[int, int]]:
+    """Best-first (doc position, chunk) by cosine; [] if the scores look useless."""
     scored = []
-    valid_positive = False
-    for i, vec in enumerate(RAG_STATE["embeddings"]):
-        score = _cosine(qvec, vec)
-        if score > 0.01:
-            valid_positive = True
-        scored.append((score, i))
-    scored.sort(reverse=True)
-
-    indices: list[int]
-    if qvec and valid_positive:
-        indices = [idx for _, idx in scored[:k]]
+    workspace = DOCS.workspace(docs)
+    if workspace is not None:
+        # Large workspace: one approximate search over all papers' vectors
+        scores, owners, rows = workspace.search(qvec, n)
+        scored.extend((float(s), int(d), int(i)) for s, d, i in zip(scores, owners, rows))
     else:
-        # Fallback: take first k chunks from the actual paper, then fill with refs
-        paper_idxs = [i for i, m in enumerate(RAG_STATE["metas"]) if m.get("source") == "paper"]
-        ref_idxs = [i for i, m in enumerate(RAG_STATE["metas"]) if m.get("source", "").startswith("ref:")]
-        indices = (paper_idxs[:k] + ref_idxs[:k])[:k]
-
-    contexts = [RAG_STATE["chunks"][i] for i in indices]
-    metas = [RAG_STATE["metas"][i] for i in indices]
-    return contexts, metas
+        for d, doc in enumerate(docs):
+            scores, top = doc.search(qvec, n)
+            scored.extend((float(s), d, int(i)) for s, i in zip(scores, top))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    if not scored or scored[0][0] <= 0.01:
+        return []
+    return [(d, i) for _, d, i in scored[:n]]
 
 
-def _strip_html(html: str) -> str:
-    """Very naive HTML -> text cleaner for reference pages."""
-    try:
-        # very naive HTML to text
-        text = re.sub(r"<script[\s\S]*?</script>", " ", html, flags=re.I)
-        text = re.sub(r"<style[\s\S]*?</style>", " ", text, flags=re.I)
-        text = re.sub(r"<[^>]+>", " ", text)
-        text = re.sub(r"\s+", " ", text)
-        return text.strip()
-    except Exception:
-        return html
-
-
-def _fetch_reference_text(url: str) -> str:
-    """Fetch and extract text from a reference URL.
-    - If it's a PDF, we parse it with PyMuPDF.
-    - Else we pull the HTML and strip tags.
+def _lexical_ranking(docs: List[Document], question: str, n: int) -> List[Tuple[int, int]]:
+    """Best-first (doc position, chunk) by BM25 (no network). BM25 scores
+    depend on each document's own statistics, so per-document rankings are
+    fused by rank instead of comparing raw scores.
     """
-    try:
-        r = requests.get(url, timeout=30, headers={"User-Agent": USER_AGENT})
-        r.raise_for_status()
-        ctype = r.headers.get("Content-Type", "").lower()
-        if "pdf" in ctype or url.lower().endswith(".pdf"):
-            doc = fitz.open(stream=r.content, filetype="pdf")
-            return "\n".join(page.get_text() for page in doc)
-        else:
-            text = r.text
-            return _strip_html(text)
-    except Exception as e:
-        print("Ref fetch error:", url, str(e))
-        return ""
+    rankings = []
+    for d, doc in enumerate(docs):
+        _, top = doc.lexical_search(question, n)
+        rankings.append([(d, int(i)) for i in top])
+    return rrf(rankings)[:n]
+
+
+def _retrieve(docs: List[Document], question: str, k: int = 5,
+              qvec: Optional[List[float]] = None) -> List[Tuple[int, int]]:
+    """Top-k (doc position, chunk row) for a question across one or more documents.
+    BM25 and cosine rankings are fused with reciprocal-rank fusion; with
+    RETRIEVAL_MODE=lexical no embedding call is made at all. If neither finds
+    anything, fall back to paper-first chunks so the model always sees real
+    content from the uploaded doc. `qvec` skips the embedding call when the
+    caller already has the question vector (the async server embeds it itself).
+    """
+    n = max(k * 4, 20)
+    rankings = []
+    if RETRIEVAL_MODE != "lexical" and qvec is None:
+        with metrics.timer("embed_query"):
+            qvec = _embed_text(question)
+    with metrics.timer("retrieve"):
+        if RETRIEVAL_MODE != "dense":
+            rankings.append(_lexical_ranking(docs, question, n))
+        if qvec:
+            rankings.append(_dense_ranking(docs, qvec, n))
+        picks: List[Tuple[int, int]] = rrf([r for r in rankings if r])[:k]
+    if not picks:
+        # Fallback: take first k chunks from the actual paper(s), then fill with refs
+        # (round-robin across documents so a workspace isn't just the first paper)
+        per_doc = [doc.fallback_indices(k) for doc in docs]
+        picks = [(d, i) for row in zip_longest(*per_doc) for d, i in enumerate(row) if i is not None][:k]
+    return picks
+
+
+def _source_label(docs: List[Document], d: int, label: str) -> str:
+    # In a workspace, tag sources with their document so citations stay unambiguous
+    return f"{docs[d].doc_id}:{label}" if len(docs) > 1 else label
 
 
 def _extract_reference_urls(full_text: str) -> List[str]:
@@ -187,85 +297,236 @@ def _extract_reference_urls(full_text: str) -> List[str]:
     return list(urls)
 
 
-def _build_index_from_texts(texts: List[str], source_label: str):
-    """Chunk + embed the given texts and overwrite the in-memory index."""
-    chunks = []
-    metas = []
-    for t in texts:
-        for c in _chunk_text(t):
-            chunks.append(c)
-            metas.append({"source": source_label})
-    embeddings = [_embed_text(c) for c in chunks]
-    RAG_STATE["chunks"] = chunks
-    RAG_STATE["embeddings"] = embeddings
-    RAG_STATE["metas"] = metas
-
-
-def _augment_with_references(full_text: str, max_refs: int = 3):
-    """Best-effort: fetch up to N references and extend the index with them."""
+def _index_texts(doc: Document, labeled: List[Tuple[str, str]], progress=None, job: Optional[Job] = None,
+                 reuse: Optional[VectorReuse] = None):
+    """Chunk + embed (text, source label) pairs and append them to the document.
+    Chunk strings exist only for the embedding call; the document keeps each
+    normalized text once plus chunk offsets. With `reuse`, chunks unchanged
+    since the previous version keep its vectors instead of being embedded.
+    """
+    parts = []
+    with metrics.timer("chunk"):
+        for text, label in labeled:
+            norm = normalize_text(text)
+            parts.append((norm, _chunk_spans(norm), label))
+        chunks = [norm[s:e] for norm, spans, _ in parts for s, e in spans]
+    if job:
+        job.add_total("index", len(chunks))
+    reused_before = reuse.reused if reuse is not None else 0
+    with metrics.timer("embed"):
+        if reuse is not None:
+            vectors = reuse.vectors(chunks, _embed_texts, progress=progress)
+        else:
+            vectors = _embed_texts(chunks, progress=progress)
+    at = 0
+    for norm, spans, label in parts:
+        doc.add_text(norm, spans, label, vectors[at : at + len(spans)])
+        metrics.CHUNKS_INDEXED.inc("paper" if label == "paper" else "reference", n=len(spans))
+        at += len(spans)
+    if metrics.ENABLED:
+        ok = sum(1 for v in vectors if len(v))
+        reused = reuse.reused - reused_before if reuse is not None else 0
+        metrics.VECTORS_EMBEDDED.inc("ok", n=ok - reused)
+        metrics.VECTORS_EMBEDDED.inc("reused", n=reused)
+        metrics.VECTORS_EMBEDDED.inc("failed", n=len(vectors) - ok)
+
+
+def _build_index_from_texts(texts: List[str], source_label: str, doc: Document, job: Optional[Job] = None,
+                            reuse: Optional[VectorReuse] = None):
+    """Chunk + embed the given texts and append them to the document's index."""
+    _index_texts(doc, [(t, source_label) for t in texts], progress=job.progress("index") if job else None, job=job,
+                 reuse=reuse)
+
+
+def _augment_with_references(doc: Document, full_text: str, max_refs: int = REF_MAX, job: Optional[Job] = None,
+                             reuse: Optional[VectorReuse] = None):
+    """Best-effort: fetch up to N references and extend the document's index with them."""
     urls = _extract_reference_urls(full_text)[:max_refs]
-    texts = []
-    for u in urls:
-        t = _fetch_reference_text(u)
-        if t:
-            texts.append(t)
+    if job:
+        job.set_total("references", len(urls))
+    fetched = REFS.fetch_many(urls, deadline=REF_DEADLINE, progress=job.progress("references") if job else None)
+    texts = [t for t in fetched if t]
     if not texts:
         return []
-    # Append to existing state
-    new_chunks = []
-    new_metas = []
-    for i, t in enumerate(texts):
-        label = f"ref:{i+1}"
-        for c in _chunk_text(t):
-            new_chunks.append(c)
-            new_metas.append({"source": label})
-    new_embs = [_embed_text(c) for c in new_chunks]
-    RAG_STATE["chunks"].extend(new_chunks)
-    RAG_STATE["embeddings"].extend(new_embs)
-    RAG_STATE["metas"].extend(new_metas)
+    _index_texts(doc, [(t, f"ref:{i+1}") for i, t in enumerate(texts)], reuse=reuse)
     return urls
 
 
-def _answer_with_context(question: str) -> Dict[str, Any]:
-    """Assemble a grounded prompt from retrieved chunks and ask Gemini."""
-    if not GEMINI_API_KEY:
-        return {"answer": "Missing GEMINI_API_KEY.", "sources": []}
-    contexts, metas = _search_similar(question, k=6)
-    # Always prepend a brief intro from the paper itself as an anchor
-    intro = (RAG_STATE.get("paper_text") or "").strip()[:1200]
-    if intro:
-        contexts = [intro] + contexts
-        metas = [{"source": "paper:intro"}] + metas
-    system = (
-        "You are an expert assistant for research papers. "
-        "Use ONLY the given source snippets, which come from the uploaded paper and (when available) its cited references. "
-        "Prioritize the uploaded paper; draw on cited references only to supplement details present in the sources. "
-        "If the sources do not contain sufficient information to answer, say you don't have enough information. "
-        "Answer as a domain expert: precise, concise, and technically accurate. Also giving more context for the user to understand "
-        "Cite supporting snippets using [S1], [S2], ... markers tied to the provided sources."
+ASK_K = 6
+ASK_SYSTEM = (
+    "You are an expert assistant for research papers. "
+    "Use ONLY the given source snippets, which come from the uploaded paper and (when available) its cited references. "
+    "Prioritize the uploaded paper; draw on cited references only to supplement details present in the sources. "
+    "If the sources do not contain sufficient information to answer, say you don't have enough information. "
+    "Answer as a domain expert: precise, concise, and technically accurate. Also giving more context for the user to understand "
+    "Cite supporting snippets using [S1], [S2], ... markers tied to the provided sources."
+)
+ASK_GENERATION_CONFIG = {"temperature": 0.2, "topP": 0.8, "maxOutputTokens": 512}
+
+
+def _ask_cache_key(question: str, docs: List[Document]) -> str:
+    """Everything that shapes an answer: the documents' current indexes, the
+    (whitespace-normalized) question, retrieval and generation settings.
+    Workspace answers also depend on doc_ids, which appear in source labels.
+    """
+    return response_key(
+        "ask",
+        [(d.doc_id if len(docs) > 1 else "", d.fingerprint()) for d in docs],
+        " ".join(question.split()),
+        ASK_MODEL, ASK_SYSTEM, ASK_GENERATION_CONFIG, ASK_K, EMBEDDER.model,
+        RETRIEVAL_MODE, CONTEXT_TOKEN_BUDGET,
     )
+
+
+def _assemble_context(question: str, docs: List[Document], qvec: Optional[List[float]] = None):
+    """Retrieved chunks (plus the paper intro as an anchor), merged,
+    deduplicated and packed into CONTEXT_TOKEN_BUDGET.
+    Returns (texts, source_labels, report).
+    """
+    picks = _retrieve(docs, question, k=ASK_K, qvec=qvec)
+    cands: List[Candidate] = []
+    # Always prepend a brief intro from the (first) paper itself as an anchor
+    intro = docs[0].intro(1200)
+    if intro:
+        span = docs[0].spans([], intro=len(intro))[0]
+        where = (0, span[0]) if span else None
+        cands.append(Candidate(intro, "paper:intro", 0, where, *(span[1:] if span else (0, 0))))
+    for d, i in picks:
+        texts, ms = docs[d].get([i])
+        span = docs[d].spans([i])[0]
+        where = (d, span[0]) if span else None
+        label = _source_label(docs, d, ms[0]["source"])
+        cands.append(Candidate(texts[0], label, len(cands), where, *(span[1:] if span else (0, 0))))
+    with metrics.timer("context"):
+        packed, report = budget_context(
+            cands, CONTEXT_TOKEN_BUDGET, lambda d, b, s, e: docs[d].span_text(b, s, e)
+        )
+    CONTEXT_STATS.add(report)
+    return [c.text for c in packed], [c.label for c in packed], report
+
+
+def _build_ask_payload(question: str, docs: List[Document], qvec: Optional[List[float]] = None):
+    """Retrieve sources for the question and build the Gemini request body.
+    Returns (payload, source_labels, context_report).
+    """
+    contexts, labels, report = _assemble_context(question, docs, qvec)
     sources_text = "\n\n".join([f"[S{i+1}] {c}" for i, c in enumerate(contexts)])
     user = f"Question: {question}\n\nSources:\n{sources_text}"
 
-    headers = {"Content-Type": "application/json", "X-Goog-Api-Key": GEMINI_API_KEY}
     payload = {
         "contents": [
-            {"role": "user", "parts": [{"text": system}]},
+            {"role": "user", "parts": [{"text": ASK_SYSTEM}]},
             {"role": "user", "parts": [{"text": user}]},
         ],
-        "generationConfig": {"temperature": 0.2, "topP": 0.8, "maxOutputTokens": 512},
+        "generationConfig": ASK_GENERATION_CONFIG,
     }
+    return payload, labels, report
+
+
+def _answer_with_context(question: str, docs: List[Document]) -> Dict[str, Any]:
+    """Assemble a grounded prompt from retrieved chunks and ask Gemini."""
+    if not GEMINI_API_KEY:
+        return {"answer": "Missing GEMINI_API_KEY.", "sources": []}
+    key = _ask_cache_key(question, docs)
+    cached = RESPONSES.get(key) if RESPONSES else None
+    if cached is not None:
+        return cached
+    # A burst of the same question waits on the first one instead of
+    # repeating retrieval + generation
+    return dict(ASK_INFLIGHT.do(key, lambda: _generate_answer(question, docs, key)))
+
+
+def _generate_answer(question: str, docs: List[Document], key: str) -> Dict[str, Any]:
+    """Retrieve + generate (uncached path of _answer_with_context)."""
+    started = time.perf_counter()
+    payload, sources, report = _build_ask_payload(question, docs)
+    headers = {"Content-Type": "application/json", "X-Goog-Api-Key": GEMINI_API_KEY}
     try:
-        r = requests.post(GENERATE_ENDPOINT, headers=headers, json=payload, timeout=60)
+        r = shared_session().post(GENERATE_ENDPOINT, headers=headers, json=payload, timeout=60)
         r.raise_for_status()
-        data = r.json()
-        text = data['candidates'][0]['content']['parts'][0]['text']
-        return {"answer": text, "sources": [m.get("source", "S") for m in metas]}
+        text = _answer_text(r.json())
+        result = {"answer": text, "sources": sources, "context": report}
+        if RESPONSES:
+            RESPONSES.put(key, result, time.perf_counter() - started)
+        return result
     except Exception as e:
         print("Ask error:", str(e))
         return {"answer": "Error generating answer.", "sources": []}
 
 
+def _answer_text(data: Dict[str, Any]) -> str:
+    """Answer text of a generateContent response (raises if there is none)."""
+    return data['candidates'][0]['content']['parts'][0]['text']
+
+
+def _stream_deltas(line: str) -> List[str]:
+    """Text deltas carried by one line of a streamGenerateContent SSE body."""
+    if not line or not line.startswith("data:"):
+        return []
+    data = json.loads(line[5:].strip())
+    return [
+        part["text"]
+        for cand in data.get("candidates") or []
+        for part in (cand.get("content") or {}).get("parts") or []
+        if part.get("text")
+    ]
+
+
+def _sse(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_answer(question: str, docs: List[Document]):
+    """Generator of SSE events: `sources` first, then `token` deltas, then `done`.
+    Relays Gemini's streamGenerateContent output as it arrives.
+    """
+    if not GEMINI_API_KEY:
+        yield _sse("sources", [])
+        yield _sse("token", {"text": "Missing GEMINI_API_KEY."})
+        yield _sse("done", {})
+        return
+    key = _ask_cache_key(question, docs) if RESPONSES else None
+    cached = RESPONSES.get(key) if key else None
+    if cached is not None:
+        # Replay a finished answer (shared with /api/ask) as a single delta
+        yield _sse("sources", cached["sources"])
+        yield _sse("token", {"text": cached["answer"]})
+        yield _sse("done", {})
+        return
+    started = time.perf_counter()
+    payload, sources, report = _build_ask_payload(question, docs)
+    # Citations go out before any model latency so the UI can render them
+    yield _sse("sources", sources)
+    yield _sse("context", report)
+
+    headers = {"Content-Type": "application/json", "X-Goog-Api-Key": GEMINI_API_KEY}
+    r = None
+    parts: List[str] = []
+    try:
+        r = shared_session().post(STREAM_ENDPOINT, headers=headers, json=payload, timeout=60, stream=True)
+        r.raise_for_status()
+        # SSE is always UTF-8; without a charset requests would assume ISO-8859-1
+        r.encoding = "utf-8"
+        for line in r.iter_lines(decode_unicode=True):
+            for text in _stream_deltas(line):
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        # An empty stream (e.g. a blocked candidate) isn't an answer; /api/ask
+        # shares this key, so don't cache it
+        if key and parts:
+            result = {"answer": "".join(parts), "sources": sources, "context": report}
+            RESPONSES.put(key, result, time.perf_counter() - started)
+        yield _sse("done", {})
+    except Exception as e:
+        print("Ask stream error:", str(e))
+        yield _sse("error", {"error": "Error generating answer."})
+    finally:
+        # Also runs on GeneratorExit when the client disconnects mid-answer
+        if r is not None:
+            r.close()
+
+
 # -----------------------
 # Web Search (Learn More)
 # -----------------------
@@ -273,36 +534,44 @@ def _ddg_instant_answer(query: str, max_results: int = 5) -> List[Dict[str, str]
     """Use DuckDuckGo Instant Answer API to get related links.
     Returns a list of {title, url}.
     """
-    url = f"https://api.duckduckgo.com/?q={quote_plus(query)}&format=json&no_html=1&no_redirect=1"
-    results: List[Dict[str, str]] = []
     try:
-        r = requests.get(url, timeout=20, headers={"User-Agent": USER_AGENT})
+        r = shared_session().get(_ddg_instant_url(query), timeout=20, headers={"User-Agent": USER_AGENT})
         r.raise_for_status()
-        data = r.json()
-        # Abstract
-        abstract_url = (data.get("AbstractURL") or "").strip()
-        abstract_text = (data.get("AbstractText") or data.get("Heading") or "").strip()
-        if abstract_url and abstract_text:
-            results.append({"title": abstract_text, "url": abstract_url})
-
-        # RelatedTopics can be nested
-        def _collect_topics(items):
-            for it in items or []:
-                if "FirstURL" in it and it.get("Text"):
-                    yield {"title": it["Text"].strip(), "url": it["FirstURL"].strip()}
-                elif "Topics" in it:
-                    for sub in _collect_topics(it.get("Topics")):
-                        yield sub
-
-        seen = set(u["url"] for u in results)
-        for item in _collect_topics(data.get("RelatedTopics")):
-            if item["url"] not in seen:
-                results.append(item)
-                seen.add(item["url"])
-            if len(results) >= max_results:
-                break
+        return _parse_ddg_instant(r.json(), max_results)
     except Exception as e:
         print("DDG instant error:", str(e))
+    return []
+
+
+def _ddg_instant_url(query: str) -> str:
+    return f"{DDG_INSTANT_URL}?q={quote_plus(query)}&format=json&no_html=1&no_redirect=1"
+
+
+def _parse_ddg_instant(data: Dict[str, Any], max_results: int) -> List[Dict[str, str]]:
+    """{title, url} links from an Instant Answer JSON body."""
+    results: List[Dict[str, str]] = []
+    # Abstract
+    abstract_url = (data.get("AbstractURL") or "").strip()
+    abstract_text = (data.get("AbstractText") or data.get("Heading") or "").strip()
+    if abstract_url and abstract_text:
+        results.append({"title": abstract_text, "url": abstract_url})
+
+    # RelatedTopics can be nested
+    def _collect_topics(items):
+        for it in items or []:
+            if "FirstURL" in it and it.get("Text"):
+                yield {"title": it["Text"].strip(), "url": it["FirstURL"].strip()}
+            elif "Topics" in it:
+                for sub in _collect_topics(it.get("Topics")):
+                    yield sub
+
+    seen = set(u["url"] for u in results)
+    for item in _collect_topics(data.get("RelatedTopics")):
+        if item["url"] not in seen:
+            results.append(item)
+            seen.add(item["url"])
+        if len(results) >= max_results:
+            break
     return results[:max_results]
 
 
@@ -310,105 +579,248 @@ def _ddg_html_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     """Fallback: scrape DuckDuckGo HTML (non-JS) results page for links.
     Very light regex parsing to avoid adding heavy deps.
     """
-    url = f"https://duckduckgo.com/html/?q={quote_plus(query)}"
-    results: List[Dict[str, str]] = []
     try:
-        r = requests.get(url, timeout=20, headers={"User-Agent": USER_AGENT})
+        r = shared_session().get(_ddg_html_url(query), timeout=20, headers={"User-Agent": USER_AGENT})
         r.raise_for_status()
-        html = r.text
-        # Look for anchors with class result__a
-        # Example: <a rel="nofollow" class="result__a" href="https://...">Title</a>
-        for m in re.finditer(r"<a[^>]*class=\"result__a\"[^>]*href=\"([^\"]+)\"[^>]*>(.*?)</a>", html, flags=re.I|re.S):
-            href = re.sub(r"&amp;", "&", m.group(1)).strip()
-            # Strip HTML tags from title
-            title = re.sub(r"<[^>]+>", " ", m.group(2))
-            title = re.sub(r"\s+", " ", title).strip()
-            if href and title:
-                results.append({"title": title, "url": href})
-            if len(results) >= max_results:
-                break
+        return _parse_ddg_html(r.text, max_results)
     except Exception as e:
         print("DDG HTML error:", str(e))
+    return []
+
+
+def _ddg_html_url(query: str) -> str:
+    return f"{DDG_HTML_URL}?q={quote_plus(query)}"
+
+
+def _parse_ddg_html(html: str, max_results: int) -> List[Dict[str, str]]:
+    """{title, url} links from a DuckDuckGo HTML results page."""
+    results: List[Dict[str, str]] = []
+    # Look for anchors with class result__a
+    # Example: <a rel="nofollow" class="result__a" href="https://...">Title</a>
+    for m in re.finditer(r"<a[^>]*class=\"result__a\"[^>]*href=\"([^\"]+)\"[^>]*>(.*?)</a>", html, flags=re.I|re.S):
+        href = re.sub(r"&amp;", "&", m.group(1)).strip()
+        # Strip HTML tags from title
+        title = re.sub(r"<[^>]+>", " ", m.group(2))
+        title = re.sub(r"\s+", " ", title).strip()
+        if href and title:
+            results.append({"title": title, "url": href})
+        if len(results) >= max_results:
+            break
     return results[:max_results]
 
 
 def _learn_more_search(query: str, max_results: int = 5) -> List[Dict[str, str]]:
-    """Try Instant Answer first, then HTML scraping. Deduplicate and return."""
-    items = _ddg_instant_answer(query, max_results=max_results)
-    if len(items) < max_results:
-        extra = _ddg_html_search(query, max_results=max_results * 2)
-        # Deduplicate by URL
-        seen = set(i["url"] for i in items)
-        for it in extra:
-            if it["url"] not in seen:
-                items.append(it)
-                seen.add(it["url"])
-            if len(items) >= max_results:
-                break
-    return items[:max_results]
+    """Instant Answer and HTML results (hedged, cached), deduplicated."""
+    return LEARN.search(query)[:max_results]
 
 
-@app.route("/api/summarize", methods=["POST"])
-def summarize():
+def _learn_queries(data: Dict[str, Any]):
+    """Queries of a /api/learn/batch body. Returns (queries, error)."""
+    queries = data.get("queries") or data.get("key_points") or []
+    if not isinstance(queries, list):
+        return [], "'queries' must be a list of strings."
+    if len(queries) > LEARN_BATCH_MAX:
+        return [], f"At most {LEARN_BATCH_MAX} queries per batch."
+    return [str(q or "").strip() for q in queries], None
+
+
+def _read_upload() -> Tuple[str, str, Optional[str]]:
+    """Validate the multipart upload and spool it to a temp file.
+    Returns (filename, temp_path, error); the caller owns temp_path.
+    """
+    if "file" not in request.files:
+        return "", "", "Missing 'file' field in form-data."
+    file = request.files["file"]
+    filename = (file.filename or "").strip()
+    print("Received file:", filename)
+    ext = os.path.splitext(filename.lower())[1]
+    if ext not in (".pdf", ".txt"):
+        return filename, "", "Unsupported file type. Please upload a .pdf or .txt."
+    return filename, spool_upload(file.stream, suffix=ext), None
+
+
+def _iter_upload_pages(filename: str, path: str) -> Iterator[str]:
+    """Page texts of the upload, streamed (a .txt file is one page)."""
+    if filename.lower().endswith(".pdf"):
+        # Conservatively skip obvious cover/permission pages on the first 1–2 pages
+        yield from filter_noise_pages(default_extractor().iter_pages(path))
+    else:
+        with open(path, "rb") as f:
+            yield f.read().decode("utf-8", errors="ignore")
+
+
+def _ingest(job: Job, filename: str, path: str, previous: Optional[Document] = None) -> Dict[str, Any]:
+    """Full upload pipeline, reporting per-stage progress/timings on the job.
+    Pages are indexed in blocks while later pages are still being parsed, and
+    summarization runs alongside the remaining embedding work; the document is
+    registered for /api/ask as soon as both finish, before reference augmentation.
+    With `previous` (a revised version), the new index replaces it under the
+    same doc_id and unchanged chunks keep their vectors.
+    Deletes the spooled upload at `path` when done.
+    """
+    doc = Document(filename=filename, doc_id=previous.doc_id if previous is not None else None)
+    job.doc_id = doc.doc_id
+    if previous is None:
+        # A revision's doc_id was already claimed by _previous_version
+        with _INGESTING_LOCK:
+            _INGESTING.add(doc.doc_id)
+    reuse = VectorReuse(previous)
+    pages: List[str] = []
+
+    def _summarize(text: str):
+        with job.stage("summarize"):
+            # Same paper text + same summary settings -> reuse the earlier summary
+            text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            key = response_key("summary", text_hash, summary_config()) if RESPONSES else None
+            cached = RESPONSES.get(key) if key else None
+            if cached is not None:
+                cached["summary_timings"] = {"mode": "cached"}
+                return cached
+            started = time.perf_counter()
+            summary = summarize_text(text)
+            # Error results come back empty; only cache real summaries
+            if key and (summary.get("summary") or summary.get("key_points")):
+                RESPONSES.put(key, summary, time.perf_counter() - started)
+            return summary
+
+    def _index_block(block: List[str]):
+        _build_index_from_texts(["\n".join(block)], "paper", doc, job, reuse)
+
     try:
-        if "file" not in request.files:
-            return jsonify({"error": "Missing 'file' field in form-data."}), 400
-
-        file = request.files["file"]
-        filename = (file.filename or "").strip()
-
-        print("Received file:", filename)
-
-        text = ""
-        if filename.lower().endswith(".pdf"):
-            # Extract text from PDF and conservatively skip obvious cover/permission pages.
-            # Only skip the first 1–2 pages if they look like boilerplate; never drop all pages.
-            pdf_bytes = file.read()
-            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-                all_pages = [p.get_text() for p in doc]
-
-            def _is_noise_page(s: str) -> bool:
-                low = (s or "").lower()
-                return ("ieee xplore" in low and ("downloaded" in low or "permission" in low or "personal use" in low))
-
-            filtered = []
-            for i, t in enumerate(all_pages):
-                if i < 2 and _is_noise_page(t):
-                    continue
-                filtered.append(t)
-            # Fallback: if we filtered everything, keep all pages
-            if not any(s.strip() for s in filtered):
-                filtered = all_pages
-            text = "\n".join(filtered)
-        elif filename.lower().endswith(".txt"):
-            text = file.read().decode("utf-8", errors="ignore")
-        else:
-            return jsonify({"error": "Unsupported file type. Please upload a .pdf or .txt."}), 400
+        # One indexer thread keeps blocks in document order
+        with job.stage("index"), ThreadPoolExecutor(max_workers=1, thread_name_prefix="index") as indexer:
+            blocks = []
+            with job.stage("extract"):
+                pending, size = [], 0
+                for page in _iter_upload_pages(filename, path):
+                    metrics.PAGES_EXTRACTED.inc()
+                    pages.append(page)
+                    pending.append(page)
+                    size += len(page)
+                    if size >= INDEX_BLOCK_CHARS:
+                        blocks.append(indexer.submit(_index_block, pending))
+                        pending, size = [], 0
+                if pending:
+                    blocks.append(indexer.submit(_index_block, pending))
+            text = "\n".join(pages)
+
+            preview = text[:300].replace("\n", " ")
+            print("Extracted text preview (300 chars):", preview)
+
+            if not text.strip():
+                raise IngestError("No text extracted from file.")
+
+            summary_future = JOBS.side_pool.submit(_summarize, text)
+            for fut in blocks:
+                fut.result()
+    finally:
+        os.unlink(path)
+
+    summary = summary_future.result()
+    summary["learn_more_seed"] = summary.get("key_points", [summary.get("summary", "")])[0:1]
+    summary["references_used"] = []
+    summary["doc_id"] = doc.doc_id
+    summary["reindex"] = reuse.report()
+
+    # Searchable from here on (replacing an earlier version with this doc_id);
+    # references extend the same index in place
+    DOCS.put(doc, uploaded=True)
+    job.result = summary
+    job.ready = True
+
+    # Try to augment with references (best-effort)
+    with job.stage("references"):
+        refs = _augment_with_references(doc, text, job=job, reuse=reuse)
+    summary["references_used"] = refs or []
+    summary["reindex"] = reuse.report()
+    with job.stage("persist"):
+        _persist_document(doc)
+
+    print("RAG index built with", len(doc), "chunks for", doc.doc_id, "- summarization ready.",
+          "Re-embed ratio:", summary["reindex"]["re_embed_ratio"])
+    return summary
+
+
+INGEST_STAGES = ["extract", "index", "summarize", "references", "persist"]
+
+
+def _ingest_upload(job: Job, filename: str, path: str, previous: Optional[Document] = None) -> Dict[str, Any]:
+    """_ingest, then release the doc_id so it can be revised again."""
+    try:
+        return _ingest(job, filename, path, previous)
+    finally:
+        _release_ingest(previous.doc_id if previous is not None else job.doc_id)
 
-        preview = text[:300].replace("\n", " ")
-        print("Extracted text preview (300 chars):", preview)
 
-        if not text.strip():
-            return jsonify({"error": "No text extracted from file."}), 400
+def _release_ingest(doc_id: Optional[str]):
+    with _INGESTING_LOCK:
+        _INGESTING.discard(doc_id)
 
-        # Build RAG index from the uploaded text
-        RAG_STATE["paper_text"] = text
-        _build_index_from_texts([text], source_label="paper")
-        # Try to augment with references (best-effort)
-        refs = _augment_with_references(text)
 
-        summary = summarize_text(text)
-        summary["learn_more_seed"] = summary.get("key_points", [summary.get("summary", "")])[0:1]
-        summary["references_used"] = refs or []
+def _previous_version():
+    """The document an upload revises (optional form field `doc_id`), with its
+    doc_id claimed until the ingest ends (_ingest_upload releases it).
+    Returns (document or None, error, status).
+    """
+    doc_id = (request.form.get("doc_id") or "").strip()
+    if not doc_id:
+        return None, None, 200
+    doc = DOCS.get(doc_id)
+    if doc is None:
+        return None, f"Unknown document '{doc_id}'. It may have expired; upload it again without doc_id.", 404
+    with _INGESTING_LOCK:
+        if doc_id in _INGESTING:
+            return None, f"Document '{doc_id}' is still being ingested; upload the revision when it has finished.", 409
+        _INGESTING.add(doc_id)
+    return doc, None, 200
+
+
+def _read_revision():
+    """_previous_version + _read_upload. Returns (previous, filename, path, error, status)."""
+    previous, err, status = _previous_version()
+    if err:
+        return None, "", "", err, status
+    filename, path, err = _read_upload()
+    if err:
+        if previous is not None:
+            _release_ingest(previous.doc_id)
+        return None, filename, "", err, 400
+    return previous, filename, path, None, 200
 
-        print("RAG index built with", len(RAG_STATE["chunks"]), "chunks. Summarization ready.")
-        return jsonify(summary)
 
+@app.route("/api/summarize", methods=["POST"])
+def summarize():
+    try:
+        previous, filename, path, err, status = _read_revision()
+        if err:
+            return jsonify({"error": err}), status
+        return jsonify(_ingest_upload(Job(filename, INGEST_STAGES), filename, path, previous))
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error in /api/summarize:", str(e))
         return jsonify({"error": "Summarization failed."}), 500
 
 
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    """Asynchronous /api/summarize: returns a job id immediately (202)."""
+    previous, filename, path, err, status = _read_revision()
+    if err:
+        return jsonify({"error": err}), status
+    job = JOBS.submit(Job(filename, INGEST_STAGES), lambda j: _ingest_upload(j, filename, path, previous))
+    return jsonify({"job_id": job.job_id, "status": job.status}), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    """Stage progress/timings; `result` holds the summary once `ready` is true."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job.to_dict())
+
+
 @app.route("/api/learn", methods=["POST"])
 def learn():
     """Perform a lightweight web search for the given query and return 4-5 links.
@@ -426,23 +838,101 @@ def learn():
         return jsonify({"links": []}), 200
 
 
+@app.route("/api/learn/batch", methods=["POST"])
+def learn_batch():
+    """Links for several queries in one call (e.g. all key points of a summary).
+    Body: {"queries": ["...", ...]} (or "key_points"); results keep input order.
+    """
+    try:
+        queries, err = _learn_queries(request.get_json(force=True))
+        if err:
+            return jsonify({"error": err}), 400
+        links = LEARN.search_many(queries)
+        return jsonify({"results": [{"q": q, "links": l} for q, l in zip(queries, links)]})
+    except Exception as e:
+        print("/api/learn/batch error:", str(e))
+        return jsonify({"results": []}), 200
+
+
+def _persist_document(doc: Document):
+    """Best-effort: write the finished index to disk for restarts/other workers."""
+    if not INDEX_DIR:
+        return
+    try:
+        save_document(doc, INDEX_DIR)
+        # Swap in the mapped copy so this worker shares pages with the others
+        mapped = load_document(doc.doc_id, INDEX_DIR)
+        if mapped is not None:
+            DOCS.put(mapped)
+    except Exception as e:
+        print("Index save error:", doc.doc_id, str(e))
+
+
+def _resolve_docs(data: Dict[str, Any]):
+    """Map the request's doc_id / doc_ids (workspace) to loaded documents.
+    Without either, use the most recently uploaded paper (older clients).
+    Returns (docs, error); docs is None when an ID is unknown or evicted.
+    """
+    ids = data.get("doc_ids") or ([data["doc_id"]] if data.get("doc_id") else [])
+    if not ids:
+        doc = DOCS.latest()
+        if doc is None or not len(doc):
+            return [], "No document loaded. Upload and summarize a paper first."
+        return [doc], None
+    docs = []
+    for doc_id in dict.fromkeys(str(i) for i in ids):
+        doc = DOCS.get(doc_id)
+        if doc is None:
+            return None, f"Unknown document '{doc_id}'. It may have expired; upload it again."
+        docs.append(doc)
+    return docs, None
+
+
+def _parse_ask(data: Dict[str, Any]):
+    """Validate an /api/ask body. Returns (question, docs, error, status)."""
+    question = (data.get("question") or "").strip()
+    if not question:
+        return "", None, "Missing 'question'", 400
+    docs, err = _resolve_docs(data)
+    if err:
+        return question, None, err, 404 if docs is None else 400
+    return question, docs, None, 200
+
+
 @app.route("/api/ask", methods=["POST"])
 def ask():
     try:
-        data = request.get_json(force=True)
-        question = (data.get("question") or "").strip()
-        if not question:
-            return jsonify({"error": "Missing 'question'"}), 400
-        if not RAG_STATE["chunks"]:
-            return jsonify({"error": "No document loaded. Upload and summarize a paper first."}), 400
+        question, docs, err, status = _parse_ask(request.get_json(force=True))
+        if err:
+            return jsonify({"error": err}), status
 
-        result = _answer_with_context(question)
+        result = _answer_with_context(question, docs)
         return jsonify(result)
     except Exception as e:
         print("Ask endpoint error:", str(e))
         return jsonify({"error": "Ask failed."}), 500
 
 
+@app.route("/api/ask/stream", methods=["POST"])
+def ask_stream():
+    """Same body as /api/ask, answered as text/event-stream:
+    `sources` (list of labels), then `token` events ({"text": ...}), then `done`.
+    """
+    try:
+        question, docs, err, status = _parse_ask(request.get_json(force=True))
+        if err:
+            return jsonify({"error": err}), status
+    except Exception as e:
+        print("Ask stream endpoint error:", str(e))
+        return jsonify({"error": "Ask failed."}), 500
+
+    return Response(
+        stream_with_context(_stream_answer(question, docs)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     # Default Flask dev server (adjust host/port if needed)
     app.run(debug=True)
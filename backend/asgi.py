@@ -0,0 +1,360 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+import aiohttp
+from a2wsgi import WSGIMiddleware
+from app import (
+    app as flask_app,
+    EMBEDDER,
+    GEMINI_API_KEY,
+    GENERATE_ENDPOINT,
+    LEARN_CACHE,
+    LEARN_DEADLINE,
+    LEARN_HEDGE_SECONDS,
+    LEARN_MAX_RESULTS,
+    RESPONSES,
+    STREAM_ENDPOINT,
+    USER_AGENT,
+    _answer_text,
+    _ask_cache_key,
+    _build_ask_payload,
+    _ddg_html_url,
+    _ddg_instant_url,
+    _health_stats,
+    _learn_queries,
+    _parse_ask,
+    _parse_ddg_html,
+    _parse_ddg_instant,
+    _sse,
+    _stream_deltas,
+)
+import app as sync_app
+from http_client import async_client, close_async_client
+from learn_search import LinkSearch
+import metrics
+from singleflight import AsyncSingleFlight
+
+# Async serving mode:  uvicorn asgi:app --port 5000
+# The routes that spend their time waiting on upstream APIs (/api/ask,
+# /api/ask/stream, /api/learn[/batch]) are plain ASGI coroutines: question embedding,
+# generation and DuckDuckGo calls go through one shared aiohttp session, so
+# hundreds of requests waiting on the LLM cost a coroutine each, not a thread.
+# CPU work (retrieval, context packing) and SQLite cache I/O run on the
+# default thread pool. When a client disconnects, its handler is cancelled,
+# which closes the upstream request too. Everything else (uploads, jobs,
+# CORS preflights) is the Flask app behind a WSGI bridge, so it behaves
+# exactly as under `python app.py`, ingestion still running on job threads.
+
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+MAX_BODY_BYTES = 1024 * 1024
+
+# Concurrent identical questions share one retrieval + generation task
+ASK_INFLIGHT = AsyncSingleFlight()
+SERVER_STATS = {"requests": 0, "in_flight": 0, "disconnects": 0}
+
+_wsgi = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+# -----------------------
+# ASGI plumbing
+# -----------------------
+async def _read_json(receive) -> Dict[str, Any]:
+    body, more = b"", True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError("Request body too large.")
+    return json.loads(body or b"{}")
+
+
+def _headers(content_type: str, extra: Optional[Dict[str, str]] = None) -> List[List[bytes]]:
+    # Same CORS policy as flask-cors' default on the sync routes
+    headers = {"content-type": content_type, "access-control-allow-origin": "*", **(extra or {})}
+    return [[k.encode(), v.encode()] for k, v in headers.items()]
+
+
+async def _send_json(send, data: Any, status: int = 200):
+    body = json.dumps(data).encode()
+    await send({"type": "http.response.start", "status": status, "headers": _headers("application/json")})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _until_disconnect(receive, work: Awaitable[Any]) -> Any:
+    """Await `work`, cancelling it if the client goes away first.
+    Must be called after the request body has been read, so the next
+    receive() only returns on disconnect.
+    """
+    task = asyncio.ensure_future(work)
+
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            SERVER_STATS["disconnects"] += 1
+            raise ClientDisconnected()
+        return task.result()
+    finally:
+        for t in (task, watcher):
+            if not t.done():
+                t.cancel()
+
+
+# -----------------------
+# Ask
+# -----------------------
+async def _build_payload(question: str, docs):
+    """_build_ask_payload() with the question embedded over the async client."""
+    qvec = None
+    if sync_app.RETRIEVAL_MODE != "lexical":
+        with metrics.timer("embed_query"):
+            qvec = await EMBEDDER.aembed_query(question)
+    return await asyncio.to_thread(_build_ask_payload, question, docs, qvec)
+
+
+def _gemini_headers() -> Dict[str, str]:
+    return {"Content-Type": "application/json", "X-Goog-Api-Key": GEMINI_API_KEY}
+
+
+def _lookup_answer(question: str, docs):
+    """(cache key, cached answer or None). Blocking: the key takes each
+    document's lock (held while it indexes) and may hash the paper text.
+    """
+    key = _ask_cache_key(question, docs)
+    return key, RESPONSES.get(key) if RESPONSES else None
+
+
+async def _answer_with_context(question: str, docs) -> Dict[str, Any]:
+    if not GEMINI_API_KEY:
+        return {"answer": "Missing GEMINI_API_KEY.", "sources": []}
+    key, cached = await asyncio.to_thread(_lookup_answer, question, docs)
+    if cached is not None:
+        return cached
+    return dict(await ASK_INFLIGHT.do(key, lambda: _generate_answer(question, docs, key)))
+
+
+async def _generate_answer(question: str, docs, key: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    payload, sources, report = await _build_payload(question, docs)
+    try:
+        async with async_client().post(GENERATE_ENDPOINT, headers=_gemini_headers(), json=payload) as r:
+            r.raise_for_status()
+            data = await r.json(content_type=None)
+        result = {"answer": _answer_text(data), "sources": sources, "context": report}
+        if RESPONSES:
+            await asyncio.to_thread(RESPONSES.put, key, result, time.perf_counter() - started)
+        return result
+    except Exception as e:
+        print("Ask error:", str(e))
+        return {"answer": "Error generating answer.", "sources": []}
+
+
+async def _stream_answer(question: str, docs):
+    """Async twin of app._stream_answer (same events, same cache)."""
+    if not GEMINI_API_KEY:
+        yield _sse("sources", [])
+        yield _sse("token", {"text": "Missing GEMINI_API_KEY."})
+        yield _sse("done", {})
+        return
+    key, cached = await asyncio.to_thread(_lookup_answer, question, docs) if RESPONSES else (None, None)
+    if cached is not None:
+        yield _sse("sources", cached["sources"])
+        yield _sse("token", {"text": cached["answer"]})
+        yield _sse("done", {})
+        return
+    started = time.perf_counter()
+    payload, sources, report = await _build_payload(question, docs)
+    yield _sse("sources", sources)
+    yield _sse("context", report)
+
+    parts: List[str] = []
+    try:
+        # Leaving this block (normally, on error, or cancelled by a
+        # disconnect) closes the upstream stream
+        async with async_client().post(STREAM_ENDPOINT, headers=_gemini_headers(), json=payload) as r:
+            r.raise_for_status()
+            async for line in r.content:
+                for text in _stream_deltas(line.decode("utf-8").strip()):
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+        # An empty stream (e.g. a blocked candidate) isn't an answer; don't cache it
+        if key and parts:
+            result = {"answer": "".join(parts), "sources": sources, "context": report}
+            await asyncio.to_thread(RESPONSES.put, key, result, time.perf_counter() - started)
+        yield _sse("done", {})
+    except Exception as e:
+        print("Ask stream error:", str(e))
+        yield _sse("error", {"error": "Error generating answer."})
+
+
+async def ask(receive, send):
+    try:
+        question, docs, err, status = await asyncio.to_thread(_parse_ask, await _read_json(receive))
+        if err:
+            return await _send_json(send, {"error": err}, status)
+        result = await _until_disconnect(receive, _answer_with_context(question, docs))
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        print("Ask endpoint error:", str(e))
+        return await _send_json(send, {"error": "Ask failed."}, 500)
+    await _send_json(send, result)
+
+
+async def ask_stream(receive, send):
+    try:
+        question, docs, err, status = await asyncio.to_thread(_parse_ask, await _read_json(receive))
+        if err:
+            return await _send_json(send, {"error": err}, status)
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        print("Ask stream endpoint error:", str(e))
+        return await _send_json(send, {"error": "Ask failed."}, 500)
+
+    async def relay():
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": _headers("text/event-stream", {"cache-control": "no-cache", "x-accel-buffering": "no"}),
+        })
+        async for event in _stream_answer(question, docs):
+            await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    try:
+        await _until_disconnect(receive, relay())
+    except ClientDisconnected:
+        pass
+
+
+# -----------------------
+# Learn More
+# -----------------------
+async def _ddg_get(url: str, as_json: bool = False):
+    timeout = aiohttp.ClientTimeout(total=20)
+    async with async_client().get(url, timeout=timeout, headers={"User-Agent": USER_AGENT}) as r:
+        r.raise_for_status()
+        # The Instant Answer API labels its JSON application/x-javascript
+        return await r.json(content_type=None) if as_json else await r.text()
+
+
+async def _ddg_instant_answer(query: str) -> List[Dict[str, str]]:
+    try:
+        return _parse_ddg_instant(await _ddg_get(_ddg_instant_url(query), as_json=True), LEARN_MAX_RESULTS)
+    except Exception as e:
+        print("DDG instant error:", str(e))
+    return []
+
+
+async def _ddg_html_search(query: str) -> List[Dict[str, str]]:
+    try:
+        return _parse_ddg_html(await _ddg_get(_ddg_html_url(query)), LEARN_MAX_RESULTS * 2)
+    except Exception as e:
+        print("DDG HTML error:", str(e))
+    return []
+
+
+# Same hedging and cache as the Flask routes, with the losing source cancelled
+LEARN = LinkSearch(
+    [_ddg_instant_answer, _ddg_html_search],
+    max_results=LEARN_MAX_RESULTS,
+    hedge_delay=LEARN_HEDGE_SECONDS,
+    deadline=LEARN_DEADLINE,
+    cache=LEARN_CACHE,
+)
+
+
+async def learn(receive, send):
+    try:
+        q = ((await _read_json(receive)).get("q") or "").strip()
+        if not q:
+            return await _send_json(send, {"links": []})
+        links = await _until_disconnect(receive, LEARN.asearch(q))
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        print("/api/learn error:", str(e))
+        links = []
+    await _send_json(send, {"links": links})
+
+
+async def learn_batch(receive, send):
+    try:
+        queries, err = _learn_queries(await _read_json(receive))
+        if err:
+            return await _send_json(send, {"error": err}, 400)
+        links = await _until_disconnect(receive, LEARN.asearch_many(queries))
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        print("/api/learn/batch error:", str(e))
+        return await _send_json(send, {"results": []})
+    await _send_json(send, {"results": [{"q": q, "links": l} for q, l in zip(queries, links)]})
+
+
+async def health(receive, send):
+    stats = await asyncio.to_thread(_health_stats)
+    stats["async_server"] = {**SERVER_STATS, "ask_coalescing": ASK_INFLIGHT.stats(), "learn": LEARN.stats()}
+    await _send_json(send, stats)
+
+
+ROUTES = {
+    ("POST", "/api/ask"): ask,
+    ("POST", "/api/ask/stream"): ask_stream,
+    ("POST", "/api/learn"): learn,
+    ("POST", "/api/learn/batch"): learn_batch,
+    ("GET", "/api/health"): health,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    handler = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is None:
+        return await _wsgi(scope, receive, send)
+    SERVER_STATS["requests"] += 1
+    SERVER_STATS["in_flight"] += 1
+    headers = dict(scope.get("headers") or [])
+    tid = metrics.start_trace(headers.get(b"x-trace-id", b"").decode("latin-1"))
+    started = time.perf_counter()
+
+    async def traced_send(message):
+        # Same X-Trace-Id echo and request histogram as the Flask hooks
+        if message["type"] == "http.response.start":
+            if tid:
+                message["headers"] = list(message["headers"]) + [
+                    [b"x-trace-id", tid.encode()], [b"access-control-expose-headers", b"X-Trace-Id"],
+                ]
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, scope["path"], str(message["status"]))
+        await send(message)
+
+    try:
+        await handler(receive, traced_send)
+    finally:
+        SERVER_STATS["in_flight"] -= 1
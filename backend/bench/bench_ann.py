@@ -0,0 +1,113 @@
+"""Recall@k and latency of the IVF index against exact cosine ranking.
+
+Run from backend/:  python bench/bench_ann.py [--rows 200000] [--dim 768] [--json out.json]
+Vectors are synthetic but embedding-like (see make_model); queries are fresh
+draws from the same model, i.e. not copies of indexed rows. Also times
+incremental inserts.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ann_index import IVFIndex  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+
+
+def make_model(dim, clusters, seed=0, rank=32):
+    """Embedding-like generator: a shared mean direction (embedding spaces are
+    anisotropic), topics grouped into broad areas, Zipf-sized topics and
+    within-topic variation along a low-rank subspace plus isotropic noise.
+    Neighbourhoods straddle topic borders, unlike well-separated blobs where
+    k-means recovers the topics and recall is ~1.0 at any nprobe.
+    """
+    rng = np.random.default_rng(seed)
+    mean = 1.5 * rng.standard_normal(dim)
+    areas = rng.standard_normal((max(1, clusters // 20), dim))
+    centers = areas[rng.integers(0, areas.shape[0], clusters)] + rng.standard_normal((clusters, dim))
+    weights = 1.0 / np.arange(1, clusters + 1) ** 0.8
+    weights /= weights.sum()
+    basis = rng.standard_normal((rank, dim)) / np.sqrt(rank)
+    scales = 3.0 * np.linspace(1.0, 0.2, rank)
+
+    def sample(count, seed):
+        rs = np.random.default_rng(seed)
+        topic = rs.choice(clusters, size=count, p=weights)
+        latent = rs.standard_normal((count, rank)) * scales
+        noise = 0.6 * rs.standard_normal((count, dim))
+        return (mean + centers[topic] + latent @ basis + noise).astype(np.float32)
+
+    return sample
+
+
+def timed_search(index, queries, k, **kw):
+    out = []
+    t = time.perf_counter()
+    for q in queries:
+        out.append(index.search(q, k, **kw)[1])
+    return (time.perf_counter() - t) / len(queries), out
+
+
+def recall(approx, exact):
+    return float(np.mean([len(set(a.tolist()) & set(e.tolist())) / len(e) for a, e in zip(approx, exact)]))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--clusters", type=int, default=500, help="synthetic topic clusters")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--nprobe", default="1,2,4,8,16,32")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    sample = make_model(args.dim, args.clusters)
+    vecs = sample(args.rows, seed=1)
+    queries = sample(args.queries, seed=2)
+
+    # Exact until trained (in the foreground) below
+    index = VectorIndex(ann=IVFIndex(min_rows=args.rows + 1, background=False))
+    # Insert in ingestion-sized batches: 90% up front, the rest after training
+    split = int(args.rows * 0.9)
+    for i in range(0, split, 5000):
+        index.add(vecs[i : min(i + 5000, split)])
+
+    t = time.perf_counter()
+    index.ann.min_rows = 1
+    index.ann.train(index.matrix)
+    build = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for i in range(split, args.rows, 5000):
+        index.add(vecs[i : min(i + 5000, args.rows)])
+    insert = time.perf_counter() - t
+
+    exact_s, exact = timed_search(index, queries, args.k, exact=True)
+    results = {
+        "rows": args.rows, "dim": args.dim, "k": args.k, "lists": int(index.ann.centroids.shape[0]),
+        "build_seconds": build, "incremental_insert_seconds": insert,
+        "exact_ms": exact_s * 1000, "ivf": [],
+    }
+    print(f"{args.rows} x {args.dim}, {results['lists']} lists, build {build:.2f}s, "
+          f"insert of last {args.rows - split} rows {insert:.2f}s")
+    print(f"{'nprobe':>7} {'recall@' + str(args.k):>10} {'ms/query':>9} {'speedup':>8}")
+    print(f"{'exact':>7} {1.0:>10.3f} {exact_s * 1000:>9.2f} {1.0:>8.1f}")
+    for nprobe in [int(x) for x in args.nprobe.split(",")]:
+        index.ann.nprobe = nprobe
+        secs, approx = timed_search(index, queries, args.k)
+        r = recall(approx, exact)
+        results["ivf"].append({"nprobe": nprobe, "recall": r, "ms": secs * 1000})
+        print(f"{nprobe:>7} {r:>10.3f} {secs * 1000:>9.2f} {exact_s / secs:>8.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
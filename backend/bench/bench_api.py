@@ -0,0 +1,378 @@
+"""End-to-end API benchmark against a local stub (no network, no API key).
+
+Run from backend/:  python bench/bench_api.py [--server flask|asgi] [--sizes 20000,100000,500000]
+                    [--kinds txt,pdf] [--concurrency 8] [--json out.json] [--compare old.json]
+Starts bench/stub_server.py in-process (latency/error/rate-limit flags as in
+that script) and the backend as a subprocess with fresh cache and index
+directories, then runs, at --concurrency:
+  summarize/<kind>/<chars>  uploads of synthetic papers (distinct text each time)
+  ask                       distinct questions about the uploaded papers
+  ask_stream                the same, streamed; latency = time to first token
+  learn                     distinct Learn More queries
+Each phase reports throughput, p50/p95/p99 latency, errors and the peak RSS
+so far of the server and its child processes (PDF extraction workers), also
+given separately for the children. --json writes everything (plus git commit and arguments) for
+later runs to --compare against.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+import stub_server  # noqa: E402
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WORDS = (
+    "model data attention layer training loss results method graph token baseline encoder decoder "
+    "gradient benchmark dataset accuracy retrieval latency memory transformer sparse dense corpus"
+).split()
+SECTIONS = ["Abstract", "Introduction", "Related Work", "Method", "Experiments", "Results", "Conclusion"]
+COMPARE_KEYS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms", "server_peak_rss_mb"]
+
+
+def make_text(chars: int, seed: int) -> str:
+    """Paper-shaped filler: numbered sections of random sentences."""
+    rnd = random.Random(seed)
+    out, size, i = [f"Synthetic Paper {seed}\n"], 0, 0
+    while size < chars:
+        if i % 40 == 0:
+            out.append(f"\n{i // 40 % len(SECTIONS) + 1} {SECTIONS[i // 40 % len(SECTIONS)]}\n")
+        s = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(8, 24))).capitalize() + f" ({rnd.randint(1, 99)}). "
+        out.append(s)
+        size += len(s)
+        i += 1
+    return "".join(out)[:chars]
+
+
+def make_pdf(text: str) -> bytes:
+    import pymupdf
+
+    doc = pymupdf.open()
+    for i in range(0, len(text), 3000):
+        page = doc.new_page()
+        page.insert_textbox(pymupdf.Rect(40, 40, 560, 800), text[i : i + 3000], fontsize=7)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+def _proc_rss_kb(pid: int):
+    """(VmHWM, VmRSS) of one process in kB, or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return tuple(int(fields[k].split()[0]) for k in ("VmHWM", "VmRSS"))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _descendants(pid: int):
+    """PIDs of every live process below pid (e.g. the PDF extraction pool)."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # "pid (comm) state ppid ..."; comm may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    out, todo = [], [pid]
+    while todo:
+        kids = children.get(todo.pop(), [])
+        out += kids
+        todo += kids
+    return out
+
+
+def server_rss_mb(pid: int):
+    """(peak, current, children's peak) resident set in MB of the server and
+    its child processes (Linux only). Peaks are summed per process, so the
+    total is an upper bound; children that already exited aren't counted.
+    """
+    if not os.path.isdir("/proc"):
+        return None, None, None
+    main = _proc_rss_kb(pid)
+    if main is None:
+        return None, None, None
+    kids = [r for r in map(_proc_rss_kb, _descendants(pid)) if r is not None]
+    mb = lambda kb: round(kb / 1024, 1)  # noqa: E731
+    return mb(main[0] + sum(r[0] for r in kids)), mb(main[1] + sum(r[1] for r in kids)), mb(sum(r[0] for r in kids))
+
+
+class Backend:
+    """The app under test, in its own process, pointed at the stub."""
+
+    def __init__(self, mode: str, stub_port: int, workdir: str, extra_env):
+        self.port = free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        stub = f"http://127.0.0.1:{stub_port}"
+        env = dict(os.environ)
+        env.update({
+            "GEMINI_API_KEY": "stub",
+            "GEMINI_API_BASE": f"{stub}/v1beta",
+            "DDG_INSTANT_URL": f"{stub}/duckduckgo/instant",
+            "DDG_HTML_URL": f"{stub}/duckduckgo/html/",
+            "INDEX_DIR": os.path.join(workdir, "index"),
+            "EMBED_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+            "RESPONSE_CACHE_PATH": os.path.join(workdir, "responses.sqlite3"),
+            "PYTHONUNBUFFERED": "1",
+        })
+        env.update(extra_env)
+        if mode == "asgi":
+            cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(self.port),
+                   "--log-level", "warning"]
+        else:
+            cmd = [sys.executable, "-c",
+                   f"import app; app.app.run(host='127.0.0.1', port={self.port}, threaded=True, debug=False)"]
+        self.log_path = os.path.join(workdir, "server.log")
+        self.log = open(self.log_path, "w")
+        self.proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float = 120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                if requests.get(self.base + "/api/health", timeout=2).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"backend did not start; see {self.log_path}")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+
+_local = threading.local()
+
+
+def session() -> requests.Session:
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
+
+def run_phase(name: str, fn, items, concurrency: int, backend: Backend) -> dict:
+    """Call fn(item) -> (ok, seconds) for every item; summarize latencies."""
+    latencies, errors = [], 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as ex:
+        for ok, seconds in ex.map(fn, items):
+            latencies.append(seconds)
+            errors += not ok
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    peak, rss, children_peak = server_rss_mb(backend.proc.pid)
+    ms = lambda v: round(v * 1000, 1)  # noqa: E731
+    return {
+        "phase": name,
+        "requests": len(items),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(items) / wall, 2) if wall else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "server_peak_rss_mb": peak,
+        "server_rss_mb": rss,
+        "server_children_peak_rss_mb": children_peak,
+    }
+
+
+def timed(fn):
+    def wrapper(item):
+        t0 = time.perf_counter()
+        try:
+            ok = fn(item)
+        except requests.RequestException as e:
+            print("request error:", str(e))
+            ok = False
+        return ok, time.perf_counter() - t0
+
+    return wrapper
+
+
+def bench(args) -> dict:
+    stub = stub_server.start(stub_server.config_from_args(args))
+    workdir = tempfile.mkdtemp(prefix="roorag-bench-")
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+    backend = Backend(args.server, stub.server_port, workdir, extra_env)
+    phases, doc_ids, lock = [], [], threading.Lock()
+    try:
+        backend.wait_ready()
+        base = backend.base
+        seed = iter(range(1, 1_000_000))
+
+        @timed
+        def upload(item):
+            filename, data = item
+            r = session().post(base + "/api/summarize", files={"file": (filename, data)}, timeout=args.timeout)
+            body = r.json() if r.ok else {}
+            if body.get("doc_id"):
+                with lock:
+                    doc_ids.append(body["doc_id"])
+            return r.ok and bool(body.get("summary"))
+
+        for kind in args.kinds.split(","):
+            for chars in (int(s) for s in args.sizes.split(",")):
+                items = []
+                for _ in range(args.uploads):
+                    text = make_text(chars, next(seed))
+                    data = make_pdf(text) if kind == "pdf" else text.encode("utf-8")
+                    items.append((f"paper.{kind}", data))
+                phases.append(run_phase(f"summarize/{kind}/{chars}", upload, items, args.concurrency, backend))
+                print_phase(phases[-1])
+
+        if not doc_ids:
+            raise RuntimeError(f"no upload succeeded; see {backend.log_path}")
+        rnd = random.Random(0)
+        questions = [
+            {"question": f"What does the paper say about {rnd.choice(WORDS)} and {rnd.choice(WORDS)} ({i})?",
+             "doc_id": rnd.choice(doc_ids)}
+            for i in range(args.asks)
+        ]
+
+        @timed
+        def ask(body):
+            r = session().post(base + "/api/ask", json=body, timeout=args.timeout)
+            return r.ok and bool(r.json().get("answer"))
+
+        def ask_stream(body):
+            t0 = time.perf_counter()
+            try:
+                with session().post(base + "/api/ask/stream", json=body, stream=True, timeout=args.timeout) as r:
+                    for line in r.iter_lines():
+                        if line.startswith(b"event: token"):
+                            ttft = time.perf_counter() - t0
+                            for _ in r.iter_lines():
+                                pass
+                            return r.ok, ttft
+            except requests.RequestException as e:
+                print("request error:", str(e))
+            return False, time.perf_counter() - t0
+
+        @timed
+        def learn(q):
+            r = session().post(base + "/api/learn", json={"q": q}, timeout=args.timeout)
+            return r.ok and bool(r.json().get("links"))
+
+        # Fresh question text for the streamed phase so neither phase hits the other's cache
+        streamed = [dict(b, question=b["question"] + " (streamed)") for b in questions]
+        for name, fn, items in (
+            ("ask", ask, questions),
+            ("ask_stream", ask_stream, streamed),
+            ("learn", learn, [f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}" for i in range(args.learns)]),
+        ):
+            if items:
+                phases.append(run_phase(name, fn, items, args.concurrency, backend))
+                print_phase(phases[-1])
+        stub_stats = requests.get(f"http://127.0.0.1:{stub.server_port}/stats", timeout=5).json()
+    finally:
+        backend.stop()
+        stub.shutdown()
+    return {"meta": meta(args), "phases": phases, "stub": stub_stats}
+
+
+def meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+    }
+
+
+def print_phase(p: dict):
+    print(f"{p['phase']:<26} n={p['requests']:<4} err={p['errors']:<3} {p['throughput_rps']:>8.2f} req/s"
+          f"  p50 {p['p50_ms']:>8.1f}  p95 {p['p95_ms']:>8.1f}  p99 {p['p99_ms']:>8.1f} ms"
+          f"  peak RSS {p['server_peak_rss_mb']} MB (children {p['server_children_peak_rss_mb']} MB)", flush=True)
+
+
+def compare(old: dict, new: dict):
+    before = {p["phase"]: p for p in old.get("phases", [])}
+    print(f"\nvs {old.get('meta', {}).get('commit') or 'baseline'}:")
+    for p in new["phases"]:
+        o = before.get(p["phase"])
+        if o is None:
+            continue
+        cells = []
+        for k in COMPARE_KEYS:
+            a, b = o.get(k), p.get(k)
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+            cells.append(f"{k} {change}")
+        print(f"{p['phase']:<26} " + "  ".join(cells))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    ap.add_argument("--sizes", default="20000,100000,500000", help="paper sizes in characters")
+    ap.add_argument("--kinds", default="txt,pdf", help="upload types to benchmark")
+    ap.add_argument("--uploads", type=int, default=4, help="uploads per kind and size")
+    ap.add_argument("--asks", type=int, default=64, help="questions (and streamed questions)")
+    ap.add_argument("--learns", type=int, default=32, help="Learn More queries")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--timeout", type=float, default=300, help="per-request timeout (seconds)")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra backend setting")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="earlier --json results to compare with")
+    stub_server.add_arguments(ap)
+    args = ap.parse_args()
+
+    results = bench(args)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
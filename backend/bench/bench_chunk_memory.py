@@ -0,0 +1,83 @@
+"""Memory held per 1M indexed characters: chunk strings + meta dicts + paper
+copy (previous layout) vs ChunkStore (one buffer + offsets + interned labels).
+
+Run from backend/:  python bench/bench_chunk_memory.py [--chars 5000000] [--json out.json]
+Vectors are left out (identical in both layouts); sizes come from tracemalloc.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from chunk_store import ChunkStore  # noqa: E402
+from chunker import chunk_spans, normalize_text  # noqa: E402
+
+
+def make_blocks(chars, block=200_000):
+    rnd = random.Random(0)
+    words = "model data attention layer training loss results method graph token baseline".split()
+    text = " ".join(
+        " ".join(rnd.choice(words) for _ in range(rnd.randint(5, 25))) + "." for _ in range(chars // 80)
+    )[:chars]
+    return [text[i : i + block] for i in range(0, len(text), block)]
+
+
+def legacy(blocks):
+    paper_text = "\n".join(blocks)
+    chunks, metas = [], []
+    for b in blocks:
+        norm = normalize_text(b)
+        for s, e in chunk_spans(norm):
+            chunks.append(norm[s:e])
+            metas.append({"source": "paper"})
+    return paper_text, chunks, metas
+
+
+def compact(blocks):
+    store = ChunkStore()
+    for b in blocks:
+        norm = normalize_text(b)
+        store.add_text(norm, chunk_spans(norm), "paper")
+    return store
+
+
+def measure(fn, blocks):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    kept = fn(blocks)
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return size, kept
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chars", type=int, default=5_000_000, help="characters to index")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    blocks = make_blocks(args.chars)
+    old, (_, chunks, _) = measure(legacy, blocks)
+    new, store = measure(compact, blocks)
+    assert list(store) == chunks
+    per_m = 1_000_000 / args.chars
+    results = {
+        "chars": args.chars,
+        "chunks": len(chunks),
+        "legacy_bytes_per_1m_chars": round(old * per_m),
+        "compact_bytes_per_1m_chars": round(new * per_m),
+        "saved_bytes_per_1m_chars": round((old - new) * per_m),
+        "ratio": round(old / new, 2),
+    }
+    for k, v in results.items():
+        print(f"{k:<28} {v:>12,}" if isinstance(v, int) else f"{k:<28} {v:>12}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
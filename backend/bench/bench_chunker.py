@@ -0,0 +1,90 @@
+"""Benchmark the chunkers against the previous _chunk_text: fixed windows
+(chunk_spans) and content-defined cut points (content_spans, the upload default).
+
+Run from backend/:  python bench/bench_chunker.py [--size 2000000] [--json out.json]
+Reports wall time, chunk count and total chunk characters per input.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from chunker import chunk_spans, content_spans, normalize_text  # noqa: E402
+
+
+def legacy_chunk_text(text, max_chars=1200, overlap=120):
+    """The original app._chunk_text, kept verbatim for comparison."""
+    text = re.sub(r"\s+", " ", text).strip()
+    chunks = []
+    i = 0
+    n = len(text)
+    while i < n:
+        end = min(i + max_chars, n)
+        # try to break at sentence boundary
+        window = text[i:end]
+        if end < n:
+            m = re.search(r"[.!?]\s+[^.!?]{0,80}$", window)
+            if m:
+                end = i + m.end()
+        chunks.append(text[i:end].strip())
+        i = max(end - overlap, i + 1)
+    return [c for c in chunks if c]
+
+
+def new_chunk_text(text):
+    norm = normalize_text(text)
+    return [norm[s:e] for s, e in chunk_spans(norm)]
+
+
+def content_chunk_text(text):
+    norm = normalize_text(text)
+    return [norm[s:e] for s, e in content_spans(norm)]
+
+
+def make_inputs(size):
+    rnd = random.Random(0)
+    words = "model data attention layer training loss results method graph token".split()
+    prose = " ".join(
+        " ".join(rnd.choice(words) for _ in range(rnd.randint(5, 25))) + rnd.choice(".!?") for _ in range(size // 80)
+    )[:size]
+    return {
+        "prose": [prose],
+        "no_punctuation": [" ".join(rnd.choice(words) for _ in range(size // 6))[:size]],
+        "punctuation_dense": [". ! ? " * (size // 6)],
+        "one_long_word": ["x" * size],
+        "whitespace_heavy": [("word \n\t  " * (size // 10))],
+        # Many short texts (e.g. small reference pages): each is under one window
+        "many_short_texts": [" ".join(rnd.choice(words) for _ in range(40)) for _ in range(size // 300)],
+    }
+
+
+def run(fn, texts):
+    t = time.perf_counter()
+    out = [c for text in texts for c in fn(text)]
+    return time.perf_counter() - t, len(out), sum(len(c) for c in out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=2_000_000, help="characters per input")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'input':<18} {'impl':<7} {'seconds':>9} {'chunks':>9} {'chunk chars':>13}")
+    for name, texts in make_inputs(args.size).items():
+        for impl, fn in (("legacy", legacy_chunk_text), ("new", new_chunk_text), ("content", content_chunk_text)):
+            secs, count, chars = run(fn, texts)
+            results.append({"input": name, "impl": impl, "seconds": secs, "chunks": count, "chunk_chars": chars})
+            print(f"{name:<18} {impl:<7} {secs:>9.3f} {count:>9} {chars:>13}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"size": args.size, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
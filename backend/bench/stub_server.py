@@ -0,0 +1,286 @@
+"""Local stand-in for the Gemini and DuckDuckGo endpoints, for offline benchmarks.
+
+Run from backend/:  python bench/stub_server.py [--port 8900] [--generate-latency 0.5] ...
+Then start the backend with
+    GEMINI_API_BASE=http://127.0.0.1:8900/v1beta GEMINI_API_KEY=stub
+    DDG_INSTANT_URL=http://127.0.0.1:8900/duckduckgo/instant
+    DDG_HTML_URL=http://127.0.0.1:8900/duckduckgo/html/
+(bench/bench_api.py does all of this itself.)
+
+Serves batchEmbedContents (deterministic hash vectors), generateContent
+(strict-JSON summaries when JSON is requested, otherwise an answer),
+streamGenerateContent?alt=sse, the Instant Answer JSON and the HTML results
+page. Each endpoint has its own latency (+ uniform jitter); --error-rate
+answers a fraction of calls with 503 and --rate-limit caps requests/second
+per endpoint with 429 + Retry-After; a `script` of statuses answers an
+endpoint's first calls with those errors, in order. GET /stats returns
+per-endpoint request counts, embedding batch sizes and the most requests
+each endpoint had in flight at once.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ENDPOINTS = ("embed", "generate", "stream", "ddg")
+
+
+class StubConfig:
+    def __init__(self, latency=None, jitter=0.0, error_rate=0.0, rate_limit=0.0, dim=768,
+                 stream_chunks=20, seed=0, script=None):
+        self.latency = {e: 0.0 for e in ENDPOINTS}
+        self.latency.update(latency or {})
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.dim = dim
+        self.stream_chunks = stream_chunks
+        self.rnd = random.Random(seed)
+        # endpoint -> statuses for its first calls, e.g. {"embed": [429, 503]}
+        self.script = {e: list(v) for e, v in (script or {}).items()}
+
+
+class _Bucket:
+    """Token bucket: `rate` requests/second, bursts up to one second's worth."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def embed_vector(text: str, dim: int) -> list:
+    """Deterministic pseudo-embedding: same text -> same unit vector."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).round(6).tolist()
+
+
+def summary_json(prompt: str) -> str:
+    words = re.findall(r"[A-Za-z]{5,}", prompt)[:40] or ["paper"]
+    return json.dumps({
+        "summary": "This paper studies " + " ".join(words[:12]) + ".",
+        "key_points": [f"Point about {w}" for w in words[:5]],
+        "eli5": "It is about " + " ".join(words[:6]) + ".",
+        "action_items": [f"Read more on {w}" for w in words[5:8]],
+    })
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+    buckets = {}
+    counts = {}
+    batch_sizes = {}
+    inflight = {}
+    max_inflight = {}
+    lock = threading.Lock()
+    _active = None
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self, key: str):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _enter(self, endpoint: str):
+        with self.lock:
+            n = self.inflight[endpoint] = self.inflight.get(endpoint, 0) + 1
+            self.max_inflight[endpoint] = max(self.max_inflight.get(endpoint, 0), n)
+        self._active = endpoint
+
+    def _leave(self):
+        if self._active is not None:
+            with self.lock:
+                self.inflight[self._active] -= 1
+            self._active = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls.lock:
+            return {
+                "requests": dict(cls.counts),
+                "batch_sizes": {e: list(v) for e, v in cls.batch_sizes.items()},
+                "max_inflight": dict(cls.max_inflight),
+            }
+
+    def _send(self, status: int, body: bytes, ctype: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _gate(self, endpoint: str) -> bool:
+        """Apply rate limit / injected errors / latency. False = already answered."""
+        cfg = self.config
+        self._count(endpoint)
+        self._enter(endpoint)
+        with self.lock:
+            scripted = cfg.script[endpoint].pop(0) if cfg.script.get(endpoint) else None
+        if scripted is not None:
+            self._count(f"{endpoint}_{scripted}")
+            self._send(scripted, b'{"error": "scripted"}')
+            return False
+        if cfg.rate_limit > 0:
+            bucket = self.buckets.setdefault(endpoint, _Bucket(cfg.rate_limit))
+            if not bucket.take():
+                self._count(endpoint + "_429")
+                self._send(429, b'{"error": "rate limited"}', headers={"Retry-After": "1"})
+                return False
+        if cfg.error_rate > 0 and cfg.rnd.random() < cfg.error_rate:
+            self._count(endpoint + "_503")
+            self._send(503, b'{"error": "injected"}')
+            return False
+        delay = cfg.latency[endpoint] + cfg.rnd.uniform(0, cfg.jitter)
+        if delay > 0 and endpoint != "stream":
+            time.sleep(delay)
+        return True
+
+    def do_GET(self):
+        try:
+            self._get()
+        finally:
+            self._leave()
+
+    def do_POST(self):
+        try:
+            self._post()
+        finally:
+            self._leave()
+
+    def _get(self):
+        if self.path.startswith("/stats"):
+            return self._send(200, json.dumps(self.stats()).encode())
+        if self.path.startswith("/duckduckgo/instant"):
+            if not self._gate("ddg"):
+                return
+            q = re.search(r"q=([^&]*)", self.path)
+            q = q.group(1) if q else "x"
+            topics = [{"FirstURL": f"https://example.org/{q}/{i}", "Text": f"Topic {i}"} for i in range(3)]
+            return self._send(200, json.dumps({
+                "AbstractURL": f"https://example.org/{q}", "AbstractText": "Abstract", "RelatedTopics": topics,
+            }).encode(), "application/x-javascript")
+        if self.path.startswith("/duckduckgo/html"):
+            if not self._gate("ddg"):
+                return
+            links = "".join(
+                f'<a rel="nofollow" class="result__a" href="https://example.net/{i}">Result {i}</a>' for i in range(10)
+            )
+            return self._send(200, links.encode(), "text/html")
+        self._send(404, b"{}")
+
+    def _post(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if ":batchEmbedContents" in self.path:
+            if not self._gate("embed"):
+                return
+            texts = [r["content"]["parts"][0]["text"] for r in body.get("requests", [])]
+            with self.lock:
+                self.batch_sizes.setdefault("embed", []).append(len(texts))
+            vecs = [{"values": embed_vector(t, self.config.dim)} for t in texts]
+            return self._send(200, json.dumps({"embeddings": vecs}).encode())
+        if ":streamGenerateContent" in self.path:
+            if not self._gate("stream"):
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            n = max(1, self.config.stream_chunks)
+            step = self.config.latency["stream"] / n
+            try:
+                for i in range(n):
+                    time.sleep(step)
+                    # Non-ASCII text, sent raw: the stream has no charset, like Gemini's
+                    event = {"candidates": [{"content": {"parts": [{"text": f"tök{i} — α≤β "}]}}]}
+                    self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                self._count("stream_disconnect")
+            self.close_connection = True
+            return
+        if ":generateContent" in self.path:
+            if not self._gate("generate"):
+                return
+            parts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+            wants_json = (body.get("generationConfig") or {}).get("responseMimeType") == "application/json"
+            text = summary_json(" ".join(parts)) if wants_json else "Stub answer citing [S1]."
+            return self._send(200, json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode())
+        self._send(404, b"{}")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def stats(self) -> dict:
+        return self.RequestHandlerClass.stats()
+
+
+def start(config: StubConfig, port: int = 0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; returns the server (server_port has the port)."""
+    handler = type("Handler", (StubHandler,), {
+        "config": config, "buckets": {}, "counts": {}, "batch_sizes": {}, "inflight": {}, "max_inflight": {},
+        "lock": threading.Lock(),
+    })
+    srv = _Server(("127.0.0.1", port), handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def add_arguments(ap: argparse.ArgumentParser):
+    ap.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding batch")
+    ap.add_argument("--generate-latency", type=float, default=0.5, help="seconds per generateContent")
+    ap.add_argument("--stream-latency", type=float, default=0.5, help="seconds for a whole streamed answer")
+    ap.add_argument("--ddg-latency", type=float, default=0.2, help="seconds per DuckDuckGo call")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency (seconds)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 503")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="requests/second per endpoint (0 = none)")
+    ap.add_argument("--dim", type=int, default=768, help="embedding dimension")
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(
+        latency={"embed": args.embed_latency, "generate": args.generate_latency,
+                 "stream": args.stream_latency, "ddg": args.ddg_latency},
+        jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit, dim=args.dim,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8900)
+    add_arguments(ap)
+    args = ap.parse_args()
+    srv = start(config_from_args(args), args.port)
+    print(f"stub listening on http://127.0.0.1:{srv.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
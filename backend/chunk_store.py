@@ -0,0 +1,137 @@
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Compact in-memory chunk storage for a Document.
+# Each indexed text (a block of the paper, a fetched reference) is kept once
+# as a normalized buffer; chunks are (buffer, start, end) rows in typed arrays,
+# so the overlap between neighbouring windows isn't stored twice and there is
+# no str object per chunk. Source labels are interned into a small table with
+# a uint16 id per chunk instead of a {"source": ...} dict each. Chunk strings
+# and meta dicts are only built when someone indexes into the store (e.g. when
+# a prompt is assembled). The paper text itself is the join of the "paper"
+# buffers, so it isn't held as a separate copy either.
+
+
+class ChunkStore(Sequence):
+    """Sequence of chunk strings backed by shared text buffers + offsets."""
+
+    def __init__(self):
+        self._bufs: List[str] = []
+        self._buf_labels = array("H")
+        self._buf = array("I")
+        self._start = array("I")
+        self._end = array("I")
+        self._label_ids = array("H")
+        self.labels: List[str] = []
+        self._label_index: Dict[str, int] = {}
+        self.metas = ChunkMetas(self)
+
+    @classmethod
+    def from_sequences(cls, chunks: Sequence, metas: Sequence) -> "ChunkStore":
+        """Copy chunks/metas from any sequences (e.g. a document opened from disk)."""
+        store = cls()
+        store.add_strings(chunks, [m.get("source", "") for m in metas])
+        return store
+
+    def intern(self, label: str) -> int:
+        lid = self._label_index.get(label)
+        if lid is None:
+            lid = self._label_index[label] = len(self.labels)
+            self.labels.append(label)
+        return lid
+
+    def add_text(self, norm: str, spans: Iterable[Tuple[int, int]], label: str) -> int:
+        """Append the chunks spans of one normalized text; returns how many."""
+        spans = list(spans)
+        if not spans:
+            return 0
+        b = len(self._bufs)
+        lid = self.intern(label)
+        self._bufs.append(norm)
+        self._buf_labels.append(lid)
+        for s, e in spans:
+            self._buf.append(b)
+            self._start.append(s)
+            self._end.append(e)
+            self._label_ids.append(lid)
+        return len(spans)
+
+    def add_strings(self, chunks: Iterable[str], labels: Iterable[str]):
+        """Append standalone chunk strings (each becomes its own buffer)."""
+        for chunk, label in zip(chunks, labels):
+            self.add_text(chunk, [(0, len(chunk))], label)
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._bufs[self._buf[i]][self._start[i] : self._end[i]]
+
+    def label(self, i: int) -> str:
+        return self.labels[self._label_ids[i]]
+
+    def span(self, i: int) -> Tuple[int, int, int]:
+        """(buffer, start, end) of chunk i."""
+        return self._buf[i], self._start[i], self._end[i]
+
+    def span_text(self, buf: int, start: int, end: int) -> str:
+        return self._bufs[buf][start:end]
+
+    def prefix_span(self, buf: int, n: int) -> Tuple[int, int, int]:
+        """Span of the first n characters of a buffer."""
+        return buf, 0, min(n, len(self._bufs[buf]))
+
+    def buffer_count(self) -> int:
+        return len(self._bufs)
+
+    def buffer(self, buf: int) -> Tuple[str, str]:
+        """(text, label) of one buffer."""
+        return self._bufs[buf], self.labels[self._buf_labels[buf]]
+
+    def first_buffer(self, label: str) -> Optional[int]:
+        """Index of the first buffer with this label (None if there is none)."""
+        lid = self._label_index.get(label)
+        for b, l in enumerate(self._buf_labels):
+            if l == lid:
+                return b
+        return None
+
+    def text(self, label: str) -> str:
+        """All buffers with this label, joined (e.g. the whole paper)."""
+        lid = self._label_index.get(label)
+        return " ".join(b for b, l in zip(self._bufs, self._buf_labels) if l == lid)
+
+    def prefix(self, label: str, n: int) -> str:
+        """First n characters of text(label) without joining everything."""
+        lid = self._label_index.get(label)
+        out, size = [], 0
+        for b, l in zip(self._bufs, self._buf_labels):
+            if l == lid:
+                out.append(b[: n - size])
+                size += len(out[-1]) + 1
+                if size >= n:
+                    break
+        return " ".join(out)[:n]
+
+    def nbytes(self) -> int:
+        arrays = (self._buf, self._start, self._end, self._label_ids, self._buf_labels)
+        return sum(sys.getsizeof(b) for b in self._bufs) + sum(a.itemsize * len(a) for a in arrays)
+
+
+class ChunkMetas(Sequence):
+    """Per-chunk {"source": label} dicts, built on access."""
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {"source": self._store.label(i)}
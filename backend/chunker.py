@@ -0,0 +1,149 @@
+import re
+import zlib
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+import numpy as np
+
+# Single-pass chunker for retrieval.
+# The text is whitespace-normalized once and sentence boundaries are found
+# with one vectorized scan; chunking then walks forward over those offsets
+# (binary search per chunk) and emits (start, end) spans into the normalized text
+# instead of copying strings. Each step advances by at least half a window,
+# so the chunk count is bounded by ~2n / max_size regardless of punctuation
+# (the old step could shrink to one character near the end of a text).
+#
+# unit="tokens" measures max_size/overlap in approximate tokens (words and
+# punctuation marks) rather than characters.
+#
+# content_spans() picks cut points from the text itself (a hash of the words
+# just before a sentence end) instead of from fixed offsets, so inserting or
+# deleting a passage only changes the chunks around it; the chunks after it
+# come out identical and a revised upload can reuse their vectors.
+
+_WS_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace runs to single spaces and trim."""
+    return _WS_RE.sub(" ", text).strip()
+
+
+def sentence_bounds(norm: str) -> List[int]:
+    """Offsets just past each "<.!?> " (i.e. where the next sentence starts)."""
+    if len(norm) < 2:
+        return []
+    codes = np.frombuffer(norm.encode("utf-32-le"), dtype=np.uint32)
+    head = codes[:-1]
+    punct = (head == ord(".")) | (head == ord("!")) | (head == ord("?"))
+    return (np.flatnonzero(punct & (codes[1:] == ord(" "))) + 2).tolist()
+
+
+def chunk_spans(
+    norm: str,
+    max_size: int = 1200,
+    overlap: int = 120,
+    unit: str = "chars",
+    lookback: int = 80,
+) -> List[Tuple[int, int]]:
+    """Overlapping (start, end) windows over already-normalized text.
+    A window is pulled back to the last sentence end within `lookback`
+    characters of its limit, so chunks tend to end on full sentences.
+    """
+    n = len(norm)
+    if n == 0:
+        return []
+    overlap = max(0, min(overlap, max_size - 1))
+    bounds = sentence_bounds(norm)
+
+    if unit == "tokens":
+        tok_starts = [m.start() for m in _TOKEN_RE.finditer(norm)]
+        if not tok_starts:
+            return [(0, n)]
+
+        def limit(i: int) -> int:
+            t = bisect_left(tok_starts, i) + max_size
+            return tok_starts[t] if t < len(tok_starts) else n
+
+        def back(end: int) -> int:
+            t = bisect_left(tok_starts, end) - overlap
+            return tok_starts[max(t, 0)]
+    else:
+        def limit(i: int) -> int:
+            return min(i + max_size, n)
+
+        def back(end: int) -> int:
+            return end - overlap
+
+    spans: List[Tuple[int, int]] = []
+    i = 0
+    while i < n:
+        end = limit(i)
+        if end < n:
+            # last boundary <= end, if it's close enough to the limit
+            p = bisect_right(bounds, end)
+            if p and bounds[p - 1] > i and end - bounds[p - 1] <= lookback:
+                end = bounds[p - 1]
+        s, e = i, end
+        # trim the single spaces normalization may leave at the edges
+        if norm[s] == " ":
+            s += 1
+        if e > s and norm[e - 1] == " ":
+            e -= 1
+        if e > s:
+            spans.append((s, e))
+        if end >= n:
+            break
+        nxt = back(end)
+        # Guaranteed progress: never less than half a window
+        i = max(nxt, i + max(1, (end - i) // 2))
+    return spans
+
+
+def content_spans(
+    norm: str,
+    max_size: int = 1200,
+    min_size: int = 600,
+    overlap: int = 120,
+    every: int = 4,
+    window: int = 32,
+) -> List[Tuple[int, int]]:
+    """Overlapping (start, end) chunks with content-defined cut points.
+    A sentence end is a cut point when the crc32 of the `window` characters
+    before it is divisible by `every`. Each chunk ends at the first cut point
+    at least min_size past the previous cut; with none by max_size, at the
+    last sentence end in between (or at max_size). Chunks start `overlap`
+    characters before their cut, so neighbours still share some context.
+    """
+    n = len(norm)
+    if n == 0:
+        return []
+    min_size = max(1, min(min_size, max_size))
+    overlap = max(0, min(overlap, min_size - 1))
+    bounds = sentence_bounds(norm)
+    cuts = [b for b in bounds if zlib.crc32(norm[max(0, b - window) : b].encode("utf-8")) % every == 0]
+
+    spans: List[Tuple[int, int]] = []
+    prev = 0
+    while prev < n:
+        lo, hi = prev + min_size, prev + max_size
+        if hi >= n:
+            end = n
+        else:
+            p = bisect_left(cuts, lo)
+            if p < len(cuts) and cuts[p] <= hi:
+                end = cuts[p]
+            else:
+                q = bisect_right(bounds, hi)
+                end = bounds[q - 1] if q and bounds[q - 1] >= lo else hi
+        s, e = max(0, prev - overlap), end
+        # trim the single spaces normalization may leave at the edges
+        if norm[s] == " ":
+            s += 1
+        if e > s and norm[e - 1] == " ":
+            e -= 1
+        if e > s:
+            spans.append((s, e))
+        prev = end
+    return spans
+
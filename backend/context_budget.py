@@ -0,0 +1,160 @@
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Prompt context assembly for /api/ask.
+# Retrieved chunks overlap their neighbours (chunk windows share ~10%) and
+# the paper intro usually repeats the first chunk, so the raw list sends the
+# same text several times. Here candidates are
+#   1) merged: chunks from the same text buffer whose spans overlap or touch
+#      become one span,
+#   2) deduplicated: a source whose word shingles are mostly contained in
+#      sources already kept is dropped,
+#   3) packed in rank order into a token budget (estimated tokens), trimming
+#      the last source that only partly fits at a sentence/word boundary.
+# Each request gets a report of tokens before/after; totals go to /api/health.
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token, the usual rule of thumb for English prose."""
+    return (len(text) + 3) // 4
+
+
+def shingles(text: str, n: int = 5) -> set:
+    """Hashed word n-grams (lowercased); short texts give one shingle."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i : i + n])) for i in range(len(words) - n + 1)}
+
+
+class Candidate:
+    """One retrieved source: text + label, plus its span when known.
+    `where` is (doc position, buffer) for text that is a span of a stored
+    buffer (None for free text, e.g. an intro that isn't a buffer prefix).
+    """
+
+    __slots__ = ("text", "label", "rank", "where", "start", "end")
+
+    def __init__(self, text: str, label: str, rank: int, where: Optional[Tuple[int, int]] = None,
+                 start: int = 0, end: int = 0):
+        self.text = text
+        self.label = label
+        self.rank = rank
+        self.where = where
+        self.start = start
+        self.end = end
+
+
+def merge_spans(cands: List[Candidate], span_text: Callable[[int, int, int, int], str]) -> List[Candidate]:
+    """Merge overlapping/adjacent spans of the same buffer (best rank wins)."""
+    out = [c for c in cands if c.where is None]
+    groups: Dict[Tuple[int, int], List[Candidate]] = {}
+    for c in cands:
+        if c.where is not None:
+            groups.setdefault(c.where, []).append(c)
+    for where, group in groups.items():
+        group.sort(key=lambda c: c.start)
+        cur = group[0]
+        for c in group[1:]:
+            # +1: spans are trimmed, so touching windows are one space apart
+            if c.start <= cur.end + 1:
+                best = cur if cur.rank <= c.rank else c
+                merged = Candidate("", best.label, best.rank, where, cur.start, max(cur.end, c.end))
+                cur = merged
+            else:
+                out.append(cur)
+                cur = c
+        out.append(cur)
+    for c in out:
+        if not c.text:
+            c.text = span_text(c.where[0], c.where[1], c.start, c.end)
+    out.sort(key=lambda c: c.rank)
+    return out
+
+
+def _trim(text: str, max_chars: int) -> str:
+    """Cut to max_chars, preferring the last sentence end, then a space."""
+    cut = text[:max_chars]
+    m = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if m > max_chars // 2:
+        return cut[: m + 1]
+    sp = cut.rfind(" ")
+    return cut[:sp] if sp > 0 else cut
+
+
+def budget_context(
+    cands: List[Candidate],
+    budget: int,
+    span_text: Callable[[int, int, int, int], str],
+    dup_threshold: float = 0.8,
+    min_tail_tokens: int = 64,
+) -> Tuple[List[Candidate], Dict[str, int]]:
+    """Merge, deduplicate and pack candidates (rank order) into `budget` tokens."""
+    before = sum(estimate_tokens(c.text) for c in cands)
+    merged = merge_spans(cands, span_text)
+
+    kept, seen, dupes = [], set(), 0
+    for c in merged:
+        sh = shingles(c.text)
+        if sh and len(sh & seen) >= dup_threshold * len(sh):
+            dupes += 1
+            continue
+        seen |= sh
+        kept.append(c)
+
+    packed, used, dropped, truncated = [], 0, 0, 0
+    for c in kept:
+        t = estimate_tokens(c.text)
+        if used + t > budget:
+            room = budget - used
+            if room < min_tail_tokens:
+                dropped += 1
+                continue
+            c.text = _trim(c.text, room * 4)
+            t = estimate_tokens(c.text)
+            truncated += 1
+        packed.append(c)
+        used += t
+
+    report = {
+        "candidates": len(cands),
+        "sources": len(packed),
+        "merged": len(cands) - len(merged),
+        "deduplicated": dupes,
+        "dropped": dropped,
+        "truncated": truncated,
+        "tokens_before": before,
+        "tokens_after": used,
+        "tokens_saved": before - used,
+    }
+    return packed, report
+
+
+class ContextStats:
+    """Running totals of budget_context reports."""
+
+    def __init__(self):
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def add(self, report: Dict[str, int]):
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += report["tokens_before"]
+            self.tokens_after += report["tokens_after"]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "requests": self.requests,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "saved_ratio": round(saved / self.tokens_before, 4) if self.tokens_before else 0.0,
+            }
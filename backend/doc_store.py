@@ -0,0 +1,325 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from vector_index import VectorIndex
+from chunk_store import ChunkStore
+from lexical_index import BM25Index
+from ann_index import ANN_MIN_ROWS
+
+# Per-document RAG indexes.
+# Every uploaded paper becomes a Document with its own chunks, metas and
+# VectorIndex, addressed by a doc_id. The DocumentStore keeps them in LRU
+# order under a memory budget and drops documents nobody has asked about for
+# a while. All mutation happens under locks so a threaded WSGI server can
+# index one paper while answering questions about another.
+# Large multi-paper workspaces get a WorkspaceIndex: one combined (IVF-backed)
+# VectorIndex over all their vectors, kept in step with appended chunks.
+
+
+class Document:
+    """One uploaded paper (plus any reference chunks appended later)."""
+
+    def __init__(self, paper_text: Optional[str] = None, doc_id: Optional[str] = None, filename: str = ""):
+        self.doc_id = doc_id or uuid.uuid4().hex[:16]
+        self.filename = filename
+        # None: the paper text is the "paper" chunk buffers (no separate copy)
+        self.paper_text = paper_text
+        # A compact ChunkStore while building; read-only mapped sequences when
+        # opened from disk (see index_files.py)
+        self.chunks: Sequence[str] = ChunkStore()
+        self.metas: Sequence[Dict] = self.chunks.metas
+        self.index = VectorIndex()
+        # BM25 over the same rows (kept in step by _sync_lexical; documents
+        # opened from disk map the saved postings)
+        self.lexical = BM25Index()
+        self.created = time.time()
+        self.last_access = self.created
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def paper_text(self) -> str:
+        p = self._paper
+        if p is None:
+            return self.chunks.text("paper") if isinstance(self.chunks, ChunkStore) else ""
+        return p if isinstance(p, str) else p.tobytes().decode("utf-8")
+
+    def intro(self, n: int) -> str:
+        """First n characters of the paper text (without materializing all of it)."""
+        p = self._paper
+        if p is None:
+            return self.chunks.prefix("paper", n) if isinstance(self.chunks, ChunkStore) else ""
+        if isinstance(p, str):
+            return p.strip()[:n]
+        return p[: 4 * n].tobytes().decode("utf-8", errors="ignore").strip()[:n]
+
+    @paper_text.setter
+    def paper_text(self, value):
+        # str, or a mapped uint8 array of UTF-8 bytes for on-disk documents
+        self._paper = value
+        self._content_hash: Optional[str] = None
+
+    @property
+    def content_hash(self) -> str:
+        """sha256 of the paper text (same text -> same hash across uploads/restarts)."""
+        if self._content_hash is None:
+            p = self._paper
+            if p is None:
+                p = self.paper_text
+            data = p.encode("utf-8") if isinstance(p, str) else memoryview(p)
+            self._content_hash = hashlib.sha256(data).hexdigest()
+        return self._content_hash
+
+    def fingerprint(self) -> str:
+        """Content hash + index generation. Chunks are only ever appended, so
+        the chunk count changes whenever the index does (e.g. references added).
+        """
+        with self._lock:
+            return f"{self.content_hash}:{len(self.chunks)}"
+
+    def _writable(self) -> ChunkStore:
+        if not isinstance(self.chunks, ChunkStore):
+            # Opened from disk: copy into a private store before appending
+            if self._paper is not None and not isinstance(self._paper, str):
+                self._paper = self.paper_text
+            self.chunks = ChunkStore.from_sequences(self.chunks, self.metas)
+            self.metas = self.chunks.metas
+        return self.chunks
+
+    def add_text(self, norm: str, spans: Sequence[Tuple[int, int]], label: str, vectors: Sequence[Sequence[float]]):
+        """Append the chunks (start, end) of one normalized text, with their
+        embeddings (row-aligned). The text is stored once; chunks are offsets.
+        """
+        with self._lock:
+            self._writable().add_text(norm, spans, label)
+            self.index.add(vectors)
+            self._sync_lexical()
+            if label == "paper":
+                self._content_hash = None
+
+    def _sync_lexical(self):
+        if len(self.lexical) < len(self.chunks):
+            self.lexical.add(self.chunks[i] for i in range(len(self.lexical), len(self.chunks)))
+
+    def search(self, qvec: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, chunk indices) for a query vector."""
+        with self._lock:
+            return self.index.search(qvec, k)
+
+    def lexical_search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (BM25 scores, chunk indices) for a text query; no network."""
+        with self._lock:
+            self._sync_lexical()
+            return self.lexical.search(query, k)
+
+    def fallback_indices(self, k: int) -> List[int]:
+        """First k paper chunks, then reference chunks (used when scores are weak)."""
+        with self._lock:
+            paper_idxs = [i for i, m in enumerate(self.metas) if m.get("source") == "paper"][:k]
+            ref_idxs = [i for i, m in enumerate(self.metas) if m.get("source", "").startswith("ref:")][:k]
+        return (paper_idxs + ref_idxs)[:k]
+
+    def spans(self, indices: Sequence[int], intro: int = 0) -> List[Optional[Tuple[int, int, int]]]:
+        """(buffer, start, end) per chunk row. With intro=n, a span for intro(n)
+        is prepended (None unless it is the start of the first paper buffer).
+        """
+        with self._lock:
+            out: List[Optional[Tuple[int, int, int]]] = [self.chunks.span(i) for i in indices]
+            if intro:
+                b = self.chunks.first_buffer("paper")
+                span = self.chunks.prefix_span(b, intro) if b is not None else None
+                ok = span is not None and self.chunks.span_text(*span) == self.intro(intro)
+                out.insert(0, span if ok else None)
+            return out
+
+    def span_text(self, buf: int, start: int, end: int) -> str:
+        with self._lock:
+            return self.chunks.span_text(buf, start, end)
+
+    def get(self, indices: Sequence[int]) -> Tuple[List[str], List[Dict]]:
+        """Chunk texts and metas for the given row numbers."""
+        with self._lock:
+            return [self.chunks[i] for i in indices], [self.metas[i] for i in indices]
+
+    def nbytes(self) -> int:
+        """Rough private resident size: text + vectors + per-chunk overhead.
+        Memory-mapped parts live in the shared page cache and aren't counted.
+        """
+        with self._lock:
+            total = len(self._paper) if isinstance(self._paper, str) else 0
+            if isinstance(self.chunks, ChunkStore):
+                total += self.chunks.nbytes()
+            matrix = self.index.matrix
+            if not isinstance(matrix, np.memmap):
+                total += matrix.nbytes
+            return total + self.lexical.nbytes()
+
+    def info(self) -> Dict:
+        return {
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "chunks": len(self.chunks),
+            "bytes": self.nbytes(),
+            "idle_seconds": round(time.time() - self.last_access, 1),
+        }
+
+
+class WorkspaceIndex:
+    """A single searchable space over several documents' vectors.
+    Rows are copied in as documents grow (incremental), and each global row
+    remembers its (document position, local row).
+    """
+
+    def __init__(self, docs: List[Document]):
+        self.docs = list(docs)
+        self.index = VectorIndex()
+        self._owner = np.zeros(0, dtype=np.int32)
+        self._local = np.zeros(0, dtype=np.int64)
+        self._synced = [0] * len(self.docs)
+        self._lock = threading.Lock()
+
+    def _sync_locked(self):
+        owners, locals_ = [self._owner], [self._local]
+        for d, doc in enumerate(self.docs):
+            with doc._lock:
+                start, n = self._synced[d], len(doc.index)
+                if n <= start:
+                    continue
+                self.index.add(np.asarray(doc.index.matrix[start:n]))
+            owners.append(np.full(n - start, d, dtype=np.int32))
+            locals_.append(np.arange(start, n, dtype=np.int64))
+            self._synced[d] = n
+        if len(owners) > 1:
+            self._owner = np.concatenate(owners)
+            self._local = np.concatenate(locals_)
+
+    def replace(self, docs: List[Document]):
+        """Point at new objects for the same document versions (rows already
+        copied stay valid), e.g. the mapped copy of a just-persisted document.
+        """
+        with self._lock:
+            self.docs = list(docs)
+
+    def search(self, qvec: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Top-k (scores, document positions, local chunk indices)."""
+        with self._lock:
+            self._sync_locked()
+            scores, rows = self.index.search(qvec, k)
+            return scores, self._owner[rows], self._local[rows]
+
+
+class DocumentStore:
+    """Thread-safe doc_id -> Document map with LRU + idle eviction."""
+
+    def __init__(
+        self,
+        max_bytes: int = 512 * 1024 * 1024,
+        idle_ttl: float = 3600,
+        loader: Optional[Callable[[str], Optional[Document]]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        # Called on a miss to reopen documents persisted by an earlier process
+        self.loader = loader
+        self._docs: "OrderedDict[str, Document]" = OrderedDict()
+        self._latest_id: Optional[str] = None
+        self._workspaces: "OrderedDict[Tuple[Tuple[str, float], ...], WorkspaceIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, doc: Document, uploaded: bool = False):
+        """Register (or replace) a document and enforce the budget.
+        uploaded=True marks it as the latest upload (see latest()).
+        """
+        with self._lock:
+            if uploaded:
+                self._latest_id = doc.doc_id
+            doc.last_access = time.time()
+            self._docs[doc.doc_id] = doc
+            self._docs.move_to_end(doc.doc_id)
+            self._evict_locked(keep=doc.doc_id)
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        """Fetch a document and mark it as recently used. Idle documents are
+        dropped here too, not only when another one is put.
+        """
+        with self._lock:
+            self._drop_idle_locked(keep=doc_id)
+            doc = self._docs.get(doc_id)
+            if doc is not None:
+                doc.last_access = time.time()
+                self._docs.move_to_end(doc_id)
+                return doc
+        if self.loader is None:
+            return None
+        try:
+            doc = self.loader(doc_id)
+        except Exception as e:
+            print("Index load error:", doc_id, str(e))
+            return None
+        if doc is not None:
+            self.put(doc)
+        return doc
+
+    def latest(self) -> Optional[Document]:
+        """Most recently uploaded document (for clients that don't send a doc_id);
+        reopened through the loader if it has been evicted.
+        """
+        with self._lock:
+            doc_id = self._latest_id
+        return self.get(doc_id) if doc_id else None
+
+    def workspace(self, docs: List[Document], max_workspaces: int = 4) -> Optional[WorkspaceIndex]:
+        """Combined index for a large workspace (None below ANN_MIN_ROWS total
+        chunks, where searching each document exactly is cheap). The few most
+        recent workspaces are kept; their vector copies are outside max_bytes.
+        """
+        if len(docs) < 2 or ANN_MIN_ROWS <= 0 or sum(len(d.index) for d in docs) < ANN_MIN_ROWS:
+            return None
+        # (doc_id, created) names one version of a document: a revision is a new
+        # Document, while the mapped copy swapped in after persisting (or
+        # reopened from disk) keeps its created time and rows
+        key = tuple((d.doc_id, d.created) for d in docs)
+        with self._lock:
+            ws = self._workspaces.get(key)
+            if ws is None:
+                ws = WorkspaceIndex(docs)
+                self._workspaces[key] = ws
+            elif any(a is not b for a, b in zip(ws.docs, docs)):
+                ws.replace(docs)
+            self._workspaces.move_to_end(key)
+            while len(self._workspaces) > max_workspaces:
+                self._workspaces.popitem(last=False)
+        return ws
+
+    def _drop_idle_locked(self, keep: Optional[str] = None):
+        now = time.time()
+        for doc_id in [d for d, doc in self._docs.items() if d != keep and now - doc.last_access > self.idle_ttl]:
+            del self._docs[doc_id]
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        self._drop_idle_locked(keep)
+        total = sum(doc.nbytes() for doc in self._docs.values())
+        # Oldest first; never evict the document that is being inserted
+        for doc_id in list(self._docs):
+            if total <= self.max_bytes:
+                break
+            if doc_id == keep:
+                continue
+            total -= self._docs.pop(doc_id).nbytes()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._drop_idle_locked()
+            docs = [doc.info() for doc in self._docs.values()]
+        return {
+            "documents": len(docs),
+            "chunks": sum(d["chunks"] for d in docs),
+            "bytes": sum(d["bytes"] for d in docs),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+# Content-addressed, disk-backed cache of embedding vectors.
+# Key = sha256(model name + normalized chunk text), value = raw float32 bytes.
+# Stored in SQLite (WAL mode, safe across threads and worker processes) with a
+# last_used timestamp so we can evict least-recently-used rows past a size cap.
+# Writes don't count the table: a running row estimate (exact after each
+# recount, then +1 per written row) triggers a real COUNT(*) only when it
+# passes the cap or every ~1% of the cap in writes (other workers write too),
+# and eviction then frees 5% headroom so a full cache doesn't recount on
+# every write.
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), ".cache", "embeddings.sqlite3")
+
+
+def cache_key(model: str, text: str) -> str:
+    """Hash of (model, whitespace-normalized text)."""
+    norm = re.sub(r"\s+", " ", text or "").strip()
+    return hashlib.sha256(f"{model}\0{norm}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache: key -> float32 vector."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS emb_last_used ON emb(last_used)")
+        self._recount_every = max(100, max_entries // 100)
+        self._rows = self._count()
+        self._writes = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return {key: vector} for the keys present; bumps their LRU stamp."""
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite caps bound parameters, so look up in slices
+            for i in range(0, len(uniq), 500):
+                part = uniq[i : i + 500]
+                marks = ",".join("?" * len(part))
+                for key, blob in self._db.execute(f"SELECT key, vec FROM emb WHERE key IN ({marks})", part):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                # One transaction (rolled back on error), not one per row
+                with self._db:
+                    self._db.execute("BEGIN")
+                    self._db.executemany("UPDATE emb SET last_used=? WHERE key=?", [(now, k) for k in found])
+            hit = sum(1 for k in keys if k in found)
+            self.hits += hit
+            self.misses += len(keys) - hit
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors (empty ones are skipped) and evict LRU rows past the cap."""
+        rows = [
+            (k, np.asarray(v, dtype=np.float32).tobytes(), time.time())
+            for k, v in items.items()
+            if v
+        ]
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO emb(key, vec, last_used) VALUES (?,?,?)", rows)
+            self._rows += len(rows)
+            self._writes += len(rows)
+            if self._rows > self.max_entries or self._writes >= self._recount_every:
+                self._trim_locked()
+
+    def _trim_locked(self):
+        """Recount; past the cap, delete LRU rows down to 95% of it."""
+        self._rows = self._count()
+        self._writes = 0
+        over = self._rows - self.max_entries
+        if over > 0:
+            over += self.max_entries // 20
+            deleted = self._db.execute(
+                "DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY last_used LIMIT ?)", (over,)
+            ).rowcount
+            self._rows -= deleted
+            self.evictions += deleted
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM emb").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for /api/health."""
+        with self._lock:
+            entries = self._count()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+            }
+
+
+def cache_from_env() -> Optional[EmbeddingCache]:
+    """Build the cache from EMBED_CACHE_PATH / EMBED_CACHE_MAX_ENTRIES (0 disables)."""
+    max_entries = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+    if max_entries <= 0:
+        return None
+    try:
+        return EmbeddingCache(os.getenv("EMBED_CACHE_PATH", DEFAULT_PATH), max_entries=max_entries)
+    except Exception as e:
+        print("Embedding cache disabled:", str(e))
+        return None
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+import requests
+from http_client import async_client, shared_session
+from embedding_cache import EmbeddingCache, cache_key
+from singleflight import AsyncSingleFlight, SingleFlight
+
+# Batched embedding client for Gemini (text-embedding-004).
+# Chunks are packed into batchEmbedContents requests, a bounded number of
+# batches run at once on a pooled Session, and 429/5xx responses are retried
+# with exponential backoff. Output order always matches input order; texts
+# whose batch ultimately fails come back as [] (same contract as before).
+#
+# GEMINI_API_BASE can point at a local stub server for offline testing.
+# When an EmbeddingCache is attached, only cache misses go over the network.
+# Questions go through embed_query(): a small in-process LRU of query vectors
+# plus singleflight, so a burst of the same question makes one upstream call.
+# aembed_query() is the same path for the async server, over the shared
+# aiohttp session, so waiting on the API doesn't hold a thread.
+
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+EMBED_MODEL = "models/text-embedding-004"
+MAX_EMBED_CHARS = 6000
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class EmbeddingEngine:
+    """Embed many texts with batched, concurrent, retried API calls."""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = API_BASE,
+        model: str = EMBED_MODEL,
+        batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "100")),
+        max_workers: int = int(os.getenv("EMBED_CONCURRENCY", "4")),
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        timeout: float = 60,
+        session: Optional[requests.Session] = None,
+        cache: Optional[EmbeddingCache] = None,
+        query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.endpoint = f"{base_url.rstrip('/')}/{model}:batchEmbedContents"
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or shared_session()
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="embed")
+        self.query_cache_size = query_cache_size
+        self.query_hits = 0
+        self.query_misses = 0
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
+
+    def _batch_request(self, texts: List[str]):
+        """(headers, payload) of a batchEmbedContents request."""
+        headers = {"Content-Type": "application/json", "X-Goog-Api-Key": self.api_key}
+        payload = {
+            "requests": [
+                {"model": self.model, "content": {"parts": [{"text": t[:MAX_EMBED_CHARS]}]}}
+                for t in texts
+            ]
+        }
+        return headers, payload
+
+    @staticmethod
+    def _batch_vectors(data, n: int) -> List[List[float]]:
+        embs = data.get("embeddings") or []
+        vecs = [(e or {}).get("values") or [] for e in embs]
+        # Pad defensively so row numbers stay aligned with chunks
+        return (vecs + [[]] * n)[:n]
+
+    def _retry_delay(self, r, attempt: int) -> float:
+        retry_after = r.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else self.backoff * (2 ** attempt)
+        return delay + random.uniform(0, self.backoff)
+
+    def _post_batch(self, texts: List[str]) -> List[List[float]]:
+        """Send one batchEmbedContents request, retrying transient failures."""
+        headers, payload = self._batch_request(texts)
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self.session.post(self.endpoint, headers=headers, json=payload, timeout=self.timeout)
+                if r.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    time.sleep(self._retry_delay(r, attempt))
+                    continue
+                r.raise_for_status()
+                return self._batch_vectors(r.json(), len(texts))
+            except requests.ConnectionError as e:
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+                    continue
+                print("Embedding error:", str(e))
+            except Exception as e:
+                print("Embedding error:", str(e))
+                break
+        return [[] for _ in texts]
+
+    async def _apost_batch(self, texts: List[str]) -> List[List[float]]:
+        """_post_batch() on the shared async client."""
+        import aiohttp
+
+        headers, payload = self._batch_request(texts)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with async_client().post(self.endpoint, headers=headers, json=payload, timeout=timeout) as r:
+                    if r.status not in RETRY_STATUS or attempt == self.max_retries:
+                        r.raise_for_status()
+                        return self._batch_vectors(await r.json(content_type=None), len(texts))
+                    delay = self._retry_delay(r, attempt)
+                await asyncio.sleep(delay)
+            except aiohttp.ClientConnectionError as e:
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+                    continue
+                print("Embedding error:", str(e))
+            except Exception as e:
+                print("Embedding error:", str(e))
+                break
+        return [[] for _ in texts]
+
+    def _embed_uncached(self, texts: List[str], progress: Optional[Callable[[int], None]] = None) -> List[List[float]]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        def run(batch: List[str]) -> List[List[float]]:
+            vecs = self._post_batch(batch)
+            if progress:
+                progress(len(batch))
+            return vecs
+
+        out: List[List[float]] = []
+        # map() yields results in submission order regardless of completion order
+        for vecs in self._pool.map(run, batches):
+            out.extend(vecs)
+        return out
+
+    def embed(self, texts: List[str], progress: Optional[Callable[[int], None]] = None) -> List[List[float]]:
+        """Embed texts in order. Returns one vector (or []) per input.
+        `progress(n)` is called as each batch of n texts finishes (cache hits count too).
+        """
+        if not texts:
+            return []
+        if not self.api_key:
+            return [[] for _ in texts]
+        if self.cache is None:
+            return self._embed_uncached(texts, progress)
+
+        keys = [cache_key(self.model, t) for t in texts]
+        found = self.cache.get_many(keys)
+        # Embed each distinct missing text once, even if it repeats in the input
+        todo = list(dict.fromkeys(k for k in keys if k not in found))
+        if progress:
+            progress(sum(1 for k in keys if k in found))
+        if todo:
+            first = {}
+            for k, t in zip(keys, texts):
+                first.setdefault(k, t)
+            fresh = dict(zip(todo, self._embed_uncached([first[k] for k in todo], progress)))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found.get(k) or [] for k in keys]
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text (e.g. a question). Runs in the caller's thread."""
+        if not self.api_key:
+            return []
+        if self.cache is None:
+            return self._post_batch([text])[0]
+        key = cache_key(self.model, text)
+        hit = self.cache.get_many([key]).get(key)
+        if hit:
+            return hit
+        vec = self._post_batch([text])[0]
+        self.cache.put_many({key: vec})
+        return vec
+
+    async def aembed_one(self, text: str) -> List[float]:
+        """embed_one() without blocking the event loop (cache I/O on a thread)."""
+        if not self.api_key:
+            return []
+        if self.cache is None:
+            return (await self._apost_batch([text]))[0]
+        key = cache_key(self.model, text)
+        hit = (await asyncio.to_thread(self.cache.get_many, [key])).get(key)
+        if hit:
+            return hit
+        vec = (await self._apost_batch([text]))[0]
+        await asyncio.to_thread(self.cache.put_many, {key: vec})
+        return vec
+
+    def _query_lookup(self, norm: str) -> Optional[List[float]]:
+        with self._queries_lock:
+            vec = self._queries.get(norm)
+            if vec is not None:
+                self._queries.move_to_end(norm)
+                self.query_hits += 1
+                return vec
+            self.query_misses += 1
+        return None
+
+    def _query_store(self, norm: str, vec: List[float]):
+        if vec and self.query_cache_size > 0:
+            with self._queries_lock:
+                self._queries[norm] = vec
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        """embed_one() for questions: in-process LRU by whitespace-normalized
+        text, with concurrent identical requests coalesced into one call.
+        """
+        norm = " ".join(text.split())
+        vec = self._query_lookup(norm)
+        if vec is None:
+            vec = self.inflight.do(norm, lambda: self.embed_one(norm))
+            self._query_store(norm, vec)
+        return vec
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """embed_query() for the async server (shares the same LRU)."""
+        norm = " ".join(text.split())
+        vec = self._query_lookup(norm)
+        if vec is None:
+            vec = await self.ainflight.do(norm, lambda: self.aembed_one(norm))
+            self._query_store(norm, vec)
+        return vec
+
+    def query_stats(self):
+        """Query-vector LRU and coalescing counters for /api/health."""
+        with self._queries_lock:
+            total = self.query_hits + self.query_misses
+            return {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": round(self.query_hits / total, 4) if total else 0.0,
+                "entries": len(self._queries),
+                "coalescing": self.inflight.stats(),
+                "async_coalescing": self.ainflight.stats(),
+            }
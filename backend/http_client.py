@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# Shared, pooled HTTP session for outbound calls (Gemini, reference fetches).
+# requests.Session keeps TCP/TLS connections alive between calls; the adapter
+# pool size caps how many sockets we hold per host.
+# The async server (asgi.py) uses one aiohttp.ClientSession per process
+# instead: a single connection pool shared by every in-flight request, with no
+# thread held while a request waits on the network.
+# Both clients report latency, status and body sizes of every outbound call
+# to metrics.py (nothing is attached when METRICS=0).
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+ASYNC_TIMEOUT = float(os.getenv("ASYNC_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_session = None
+_async_client = None
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """HTTPAdapter that records each request in metrics.observe_upstream()."""
+
+    def send(self, request, stream=False, **kwargs):
+        started = time.perf_counter()
+        sent = len(request.body or b"")
+        try:
+            r = super().send(request, stream=stream, **kwargs)
+        except Exception:
+            metrics.observe_upstream(request.url, time.perf_counter() - started, "error", sent, 0)
+            raise
+        elapsed = time.perf_counter() - started
+        # Streamed bodies aren't read here; fall back to the declared length
+        received = int(r.headers.get("Content-Length") or 0) if stream else len(r.content)
+        metrics.observe_upstream(request.url, elapsed, r.status_code, sent, received)
+        return r
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """Create a Session whose connection pool can serve `pool_size` threads."""
+    s = requests.Session()
+    adapter_cls = InstrumentedAdapter if metrics.ENABLED else HTTPAdapter
+    adapter = adapter_cls(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def shared_session() -> requests.Session:
+    """Process-wide pooled session (created on first use)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def async_client():
+    """Process-wide aiohttp.ClientSession (created on first use inside the event loop)."""
+    global _async_client
+    if _async_client is None:
+        import aiohttp  # only needed by the async server
+
+        _async_client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=ASYNC_TIMEOUT, connect=10),
+            trace_configs=[_trace_config()] if metrics.ENABLED else None,
+        )
+    return _async_client
+
+
+def _trace_config():
+    """aiohttp hooks feeding metrics.observe_upstream()."""
+    import aiohttp
+
+    async def on_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+        ctx.sent = 0
+
+    async def on_chunk(session, ctx, params):
+        ctx.sent += len(params.chunk)
+
+    async def on_end(session, ctx, params):
+        received = params.response.content_length or 0
+        metrics.observe_upstream(str(params.url), time.perf_counter() - ctx.started, params.response.status, ctx.sent, received)
+
+    async def on_error(session, ctx, params):
+        metrics.observe_upstream(str(params.url), time.perf_counter() - ctx.started, "error", ctx.sent, 0)
+
+    tc = aiohttp.TraceConfig()
+    tc.on_request_start.append(on_start)
+    tc.on_request_chunk_sent.append(on_chunk)
+    tc.on_request_end.append(on_end)
+    tc.on_request_exception.append(on_error)
+    return tc
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.close()
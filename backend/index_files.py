@@ -0,0 +1,260 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from chunk_store import ChunkStore
+from doc_store import Document
+from lexical_index import BM25Index
+from vector_index import VectorIndex
+
+# On-disk document index: root/<doc_id>/v-<time>-<rand>/ per saved version,
+# each holding
+#   meta.json    counts, dim, filename, source-label table
+#   vectors.f32  n x dim float32 rows (already L2-normalized)
+#   buffers.bin  UTF-8 text buffers (each indexed text once) back to back
+#   buffers.off  b+1 uint64 byte offsets into buffers.bin
+#   buffers.u16  b uint16 ids into the source-label table, one per buffer
+#   spans.u32    n x 3 uint32 (buffer, start, end) per chunk, in bytes
+#   labels.u16   n uint16 ids into the source-label table
+#   terms.txt    BM25 vocabulary, one term per line
+#   postings.off t+1 uint64 offsets into postings.u32/.u16, per term
+#   postings.u32 BM25 row ids, grouped by term
+#   postings.u16 BM25 term frequencies (same layout)
+#   lengths.u32  n BM25 token counts
+#   paper.txt    UTF-8 full paper text
+# Everything is opened read-only with np.memmap, so several workers share one
+# copy in the OS page cache and a cold start costs an mmap, not re-embedding.
+# Chunks stay (buffer, start, end) spans like in a ChunkStore, so overlapping
+# retrieved chunks can still be merged into one context span.
+# A save never touches an existing version: it writes a temp dir, renames it to
+# a new version name and readers open the newest one. Older versions are
+# deleted afterwards (and again on later saves/loads) once nothing maps them
+# any more; Windows refuses to delete mapped files, so deletion there simply
+# waits until the last worker lets go.
+
+FORMAT_VERSION = 3
+
+
+def _map(path: str, dtype, shape=None):
+    """Read-only memmap; empty files can't be mapped, so return an empty array."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(shape or (0,), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class MappedChunks(Sequence):
+    """Chunk texts decoded on demand from mapped text buffers + a span table.
+    Offsets are UTF-8 byte positions within a buffer, so every span is one
+    slice of the mapped blob.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, buf_labels: np.ndarray, spans: np.ndarray,
+                 labels: List[str]):
+        self._blob = blob
+        self._off = offsets
+        self._buf_labels = buf_labels
+        self._spans = spans
+        self._labels = labels
+
+    def __len__(self) -> int:
+        return self._spans.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.span_text(*self.span(i))
+
+    def span(self, i: int) -> Tuple[int, int, int]:
+        """(buffer, start, end) of chunk i."""
+        b, start, end = self._spans[i]
+        return int(b), int(start), int(end)
+
+    def span_text(self, buf: int, start: int, end: int) -> str:
+        base = int(self._off[buf])
+        return self._blob[base + start : base + end].tobytes().decode("utf-8")
+
+    def prefix_span(self, buf: int, n: int) -> Tuple[int, int, int]:
+        """Span of the first n characters of a buffer."""
+        base, stop = int(self._off[buf]), int(self._off[buf + 1])
+        head = self._blob[base : min(stop, base + 4 * n)].tobytes().decode("utf-8", errors="ignore")[:n]
+        return buf, 0, len(head.encode("utf-8"))
+
+    def first_buffer(self, label: str) -> Optional[int]:
+        """Index of the first buffer with this label (None if there is none)."""
+        if label not in self._labels:
+            return None
+        hits = np.flatnonzero(self._buf_labels == self._labels.index(label))
+        return int(hits[0]) if hits.shape[0] else None
+
+
+def _byte_offsets(text: str) -> Optional[np.ndarray]:
+    """UTF-8 byte offset of every character position (None for ASCII text)."""
+    if text.isascii():
+        return None
+    cps = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    sizes = 1 + (cps >= 0x80).astype(np.int64) + (cps >= 0x800) + (cps >= 0x10000)
+    out = np.zeros(len(text) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=out[1:])
+    return out
+
+
+class MappedMetas(Sequence):
+    """Per-chunk {"source": label} dicts rebuilt from a label table + mapped ids."""
+
+    def __init__(self, labels: List[str], ids: np.ndarray):
+        self._labels = labels
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {"source": self._labels[int(self._ids[i])]}
+
+
+def _versions(doc_dir: str) -> List[str]:
+    """Saved version directory names, oldest first."""
+    try:
+        return sorted(name for name in os.listdir(doc_dir) if name.startswith("v-"))
+    except FileNotFoundError:
+        return []
+
+
+def _remove_stale(doc_dir: str):
+    """Best-effort delete of every version but the newest (mapped files may
+    not be deletable yet; they are retried next time).
+    """
+    for name in _versions(doc_dir)[:-1]:
+        shutil.rmtree(os.path.join(doc_dir, name), ignore_errors=True)
+
+
+def save_document(doc: Document, root: str):
+    """Write the document as a new version under root/doc_id (temp dir + rename)."""
+    doc_dir = os.path.join(root, doc.doc_id)
+    os.makedirs(doc_dir, exist_ok=True)
+    tmp = os.path.join(doc_dir, f".tmp-{uuid.uuid4().hex[:8]}")
+    os.makedirs(tmp)
+    try:
+        with doc._lock:
+            store = doc.chunks
+            if not isinstance(store, ChunkStore):
+                store = ChunkStore.from_sequences(store, doc.metas)
+            bufs = [store.buffer(b) for b in range(store.buffer_count())]
+            spans = [store.span(i) for i in range(len(store))]
+            sources = [store.label(i) for i in range(len(store))]
+            matrix = np.ascontiguousarray(doc.index.matrix, dtype=np.float32)
+            paper_text = doc.paper_text
+            doc._sync_lexical()
+            terms, post_off, post_rows, post_tfs, lengths = doc.lexical.arrays()
+
+        labels: Dict[str, int] = {}
+        ids = np.array([labels.setdefault(s, len(labels)) for s in sources], dtype=np.uint16)
+        buf_ids = np.array([labels.setdefault(label, len(labels)) for _, label in bufs], dtype=np.uint16)
+        encoded = [text.encode("utf-8") for text, _ in bufs]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+        # Character offsets -> byte offsets, buffer by buffer (ASCII ones match)
+        table = np.array(spans, dtype=np.int64).reshape(-1, 3)
+        order = np.argsort(table[:, 0], kind="stable")
+        bounds = np.searchsorted(table[order, 0], np.arange(len(bufs) + 1))
+        for b, (text, _) in enumerate(bufs):
+            byte_at = _byte_offsets(text)
+            if byte_at is not None:
+                rows = order[bounds[b] : bounds[b + 1]]
+                table[rows, 1:] = byte_at[table[rows, 1:]]
+
+        matrix.tofile(os.path.join(tmp, "vectors.f32"))
+        with open(os.path.join(tmp, "buffers.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        offsets.tofile(os.path.join(tmp, "buffers.off"))
+        buf_ids.tofile(os.path.join(tmp, "buffers.u16"))
+        table.astype(np.uint32).tofile(os.path.join(tmp, "spans.u32"))
+        ids.tofile(os.path.join(tmp, "labels.u16"))
+        with open(os.path.join(tmp, "terms.txt"), "wb") as f:
+            f.write("\n".join(terms).encode("utf-8"))
+        post_off.tofile(os.path.join(tmp, "postings.off"))
+        post_rows.tofile(os.path.join(tmp, "postings.u32"))
+        post_tfs.tofile(os.path.join(tmp, "postings.u16"))
+        lengths.tofile(os.path.join(tmp, "lengths.u32"))
+        with open(os.path.join(tmp, "paper.txt"), "wb") as f:
+            f.write(paper_text.encode("utf-8"))
+        meta = {
+            "version": FORMAT_VERSION,
+            "doc_id": doc.doc_id,
+            "filename": doc.filename,
+            "created": doc.created,
+            "count": len(spans),
+            "buffers": len(bufs),
+            "dim": int(matrix.shape[1]) if matrix.size else 0,
+            "labels": list(labels),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # Zero-padded nanoseconds sort in save order; the suffix breaks ties
+        os.rename(tmp, os.path.join(doc_dir, f"v-{time.time_ns():020d}-{uuid.uuid4().hex[:4]}"))
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _remove_stale(doc_dir)
+
+
+def load_document(doc_id: str, root: str) -> Optional[Document]:
+    """Open a saved document read-only (zero-copy). None if it isn't on disk."""
+    # doc_ids come from clients; only accept plain names inside root
+    if not doc_id or os.path.basename(doc_id) != doc_id or doc_id.startswith("."):
+        return None
+    doc_dir = os.path.join(root, doc_id)
+    for _ in range(3):
+        versions = _versions(doc_dir)
+        if not versions:
+            return None
+        try:
+            doc = _load_version(doc_id, os.path.join(doc_dir, versions[-1]))
+        except FileNotFoundError:
+            # Replaced and deleted by another worker's save meanwhile: retry
+            continue
+        _remove_stale(doc_dir)
+        return doc
+    return None
+
+
+def _load_version(doc_id: str, path: str) -> Optional[Document]:
+    """Map one version directory (None if it has another FORMAT_VERSION)."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        return None
+    n, dim = meta["count"], meta["dim"]
+
+    doc = Document(doc_id=doc_id, filename=meta.get("filename", ""))
+    doc.created = meta.get("created", doc.created)
+    doc.chunks = MappedChunks(
+        _map(os.path.join(path, "buffers.bin"), np.uint8),
+        _map(os.path.join(path, "buffers.off"), np.uint64),
+        _map(os.path.join(path, "buffers.u16"), np.uint16),
+        _map(os.path.join(path, "spans.u32"), np.uint32, (n, 3)),
+        meta["labels"],
+    )
+    doc.metas = MappedMetas(meta["labels"], _map(os.path.join(path, "labels.u16"), np.uint16))
+    if dim:
+        doc.index = VectorIndex.from_matrix(_map(os.path.join(path, "vectors.f32"), np.float32, (n, dim)))
+    else:
+        doc.index = VectorIndex.from_matrix(None, count=n)
+    doc.paper_text = _map(os.path.join(path, "paper.txt"), np.uint8)
+    with open(os.path.join(path, "terms.txt"), "rb") as f:
+        terms = f.read().decode("utf-8")
+    doc.lexical = BM25Index.from_arrays(
+        terms.split("\n") if terms else [],
+        _map(os.path.join(path, "postings.off"), np.uint64),
+        _map(os.path.join(path, "postings.u32"), np.uint32),
+        _map(os.path.join(path, "postings.u16"), np.uint16),
+        _map(os.path.join(path, "lengths.u32"), np.uint32),
+    )
+    return doc
@@ -0,0 +1,139 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+import metrics
+
+# Background ingestion jobs.
+# An upload is turned into a Job and run on a small worker pool; each pipeline
+# stage (extract, index, summarize, references, ...) reports progress and
+# timings on the Job so clients can poll /api/jobs/<id>. A second pool runs
+# stages that should overlap inside one job (e.g. summarize while indexing).
+# Stage durations also go to the process-wide metrics (roorag_stage_seconds).
+
+
+class IngestError(Exception):
+    """A user-facing ingestion failure (bad/empty upload), reported verbatim."""
+
+
+class Job:
+    """Status + per-stage progress of one ingestion run."""
+
+    def __init__(self, filename: str = "", stages: Optional[List[str]] = None):
+        self.job_id = uuid.uuid4().hex[:16]
+        self.filename = filename
+        self.status = "queued"  # queued | running | done | error
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.doc_id: Optional[str] = None
+        self.ready = False  # document is searchable via /api/ask
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.stages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        for name in stages or []:
+            self._stage(name)
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        st = self.stages.get(name)
+        if st is None:
+            st = {"status": "pending", "done": 0, "total": None, "started": None, "seconds": None}
+            self.stages[name] = st
+        return st
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage and mark it running -> done/error."""
+        with self._lock:
+            st = self._stage(name)
+            st["status"] = "running"
+            st["started"] = time.time()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                st["status"] = "error"
+                st["seconds"] = round(time.time() - st["started"], 3)
+            metrics.STAGE_SECONDS.observe(time.time() - st["started"], f"ingest_{name}")
+            raise
+        with self._lock:
+            st["status"] = "done"
+            st["seconds"] = round(time.time() - st["started"], 3)
+        metrics.STAGE_SECONDS.observe(time.time() - st["started"], f"ingest_{name}")
+
+    def set_total(self, name: str, total: int):
+        with self._lock:
+            self._stage(name)["total"] = total
+
+    def add_total(self, name: str, n: int):
+        """Grow a stage's total when work is discovered incrementally."""
+        with self._lock:
+            st = self._stage(name)
+            st["total"] = (st["total"] or 0) + n
+
+    def advance(self, name: str, n: int = 1):
+        """Record n more units of work (chunks embedded, references fetched...)."""
+        with self._lock:
+            self._stage(name)["done"] += n
+
+    def progress(self, name: str) -> Callable[[int], None]:
+        """Callback form of advance() for code that reports batch completions."""
+        return lambda n: self.advance(name, n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "filename": self.filename,
+                "status": self.status,
+                "ready": self.ready,
+                "doc_id": self.doc_id,
+                "error": self.error,
+                "elapsed": round((self.finished or time.time()) - self.created, 3),
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "result": self.result,
+            }
+
+
+class JobManager:
+    """Runs jobs on a bounded pool and remembers them for a while."""
+
+    def __init__(self, max_workers: int = 2, ttl: float = 3600):
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        # Separate pool for overlapping stages, so a job never waits on its own pool
+        self.side_pool = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="ingest-side")
+
+    def submit(self, job: Job, fn: Callable[[Job], Any]) -> Job:
+        """Queue fn(job) and return the job immediately."""
+        with self._lock:
+            self._prune_locked()
+            self._jobs[job.job_id] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]):
+        job.status = "running"
+        try:
+            fn(job)
+            job.status = "done"
+        except Exception as e:
+            print("Ingest job error:", job.job_id, str(e))
+            job.error = str(e) if isinstance(e, IngestError) else "Ingestion failed."
+            job.status = "error"
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune_locked(self):
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items() if job.finished and now - job.finished > self.ttl]:
+            del self._jobs[job_id]
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from singleflight import AsyncSingleFlight, SingleFlight
+
+# "Learn more" link search over several sources, in priority order
+# (DuckDuckGo Instant Answer first, then the HTML results page).
+# Sources are hedged: the first starts at once, each next one starts
+# hedge_delay seconds later (or as soon as everything started so far has
+# finished without enough links). The search ends as soon as the finished
+# sources add up to max_results links, merged in source order and
+# deduplicated by URL, so a slow source no longer delays a fast one.
+# Results are cached per normalized query with a TTL (empty results get a
+# shorter one) and concurrent identical queries share one search.
+# search() runs sources on a thread pool (Flask); asearch() runs coroutine
+# sources on the event loop (asgi.py) and cancels the losers.
+
+Links = List[Dict[str, str]]
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def merge_links(lists: List[Links], max_results: int) -> Links:
+    """Concatenate link lists, dropping repeated URLs, up to max_results."""
+    out: Links = []
+    seen = set()
+    for links in lists:
+        for it in links:
+            if len(out) >= max_results:
+                return out
+            if it["url"] not in seen:
+                out.append(it)
+                seen.add(it["url"])
+    return out
+
+
+class LinkCache:
+    """Thread-safe LRU of link lists per normalized query, with TTLs."""
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 6 * 3600, negative_ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[float, Links]]" = OrderedDict()  # key -> (expires, links)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Links]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return list(item[1])
+
+    def put(self, key: str, links: Links):
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl if links else self.negative_ttl
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.time() + ttl, list(links))
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class LinkSearch:
+    """Hedged, cached search over `sources` (each fn(query) -> links)."""
+
+    def __init__(
+        self,
+        sources: List[Callable],
+        max_results: int = 5,
+        hedge_delay: float = 1.0,
+        deadline: float = 20.0,
+        cache: Optional[LinkCache] = None,
+        max_workers: int = 8,
+    ):
+        self.sources = sources
+        self.max_results = max_results
+        self.hedge_delay = hedge_delay
+        self.deadline = deadline
+        self.cache = cache
+        self.searches = 0
+        self.hedged = 0  # searches that needed more than the first source
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
+
+    def _cached(self, key: str) -> Optional[Links]:
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _finish(self, key: str, lists: List[Links], started: int, final: bool) -> Links:
+        links = merge_links(lists, self.max_results)
+        with self._lock:
+            self.searches += 1
+            self.hedged += started > 1
+        # A search cut off by the deadline short of max_results isn't cached,
+        # so the next request retries the slow source
+        if (final or len(links) >= self.max_results) and self.cache is not None:
+            self.cache.put(key, links)
+        return links
+
+    def _next_wait(self, started: int, elapsed: float) -> float:
+        """Seconds until the next source is due (or the deadline)."""
+        due = started * self.hedge_delay if started < len(self.sources) else self.deadline
+        return max(0.0, min(due, self.deadline) - elapsed)
+
+    # -- threads --------------------------------------------------------
+
+    def search(self, query: str) -> Links:
+        key = normalize_query(query)
+        if not key:
+            return []
+        hit = self._cached(key)
+        if hit is not None:
+            return hit
+        return list(self.inflight.do(key, lambda: self._search(query, key)))
+
+    def search_many(self, queries: List[str]) -> List[Links]:
+        """search() for several queries at once (e.g. every key point)."""
+        unique = list(dict.fromkeys(queries))
+        if not unique:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(unique), self._max_workers)) as ex:
+            found = dict(zip(unique, ex.map(self.search, unique)))
+        return [found[q] for q in queries]
+
+    def _call(self, fn: Callable, query: str) -> Links:
+        try:
+            return fn(query) or []
+        except Exception as e:
+            print("Learn source error:", str(e))
+            return []
+
+    def _search(self, query: str, key: str) -> Links:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Room for every source of max_workers searches at once (search_many's limit)
+                    self._pool = ThreadPoolExecutor(max_workers=self._max_workers * max(1, len(self.sources)),
+                                                    thread_name_prefix="learn")
+        t0 = time.monotonic()
+        futures = []
+        try:
+            while True:
+                elapsed = time.monotonic() - t0
+                finished = all(f.done() for f in futures)
+                lists = [f.result() if f.done() else [] for f in futures]
+                final = finished and len(futures) == len(self.sources)
+                if final or elapsed >= self.deadline or len(merge_links(lists, self.max_results)) >= self.max_results:
+                    return self._finish(key, lists, len(futures), final)
+                if len(futures) < len(self.sources) and (finished or elapsed >= len(futures) * self.hedge_delay):
+                    futures.append(self._pool.submit(self._call, self.sources[len(futures)], query))
+                    continue
+                wait([f for f in futures if not f.done()], timeout=self._next_wait(len(futures), elapsed),
+                     return_when=FIRST_COMPLETED)
+        finally:
+            # Drop calls still queued; ones already running finish in the
+            # background (requests can't be interrupted)
+            for f in futures:
+                if not f.done():
+                    f.cancel()
+
+    # -- event loop -----------------------------------------------------
+
+    async def asearch(self, query: str) -> Links:
+        key = normalize_query(query)
+        if not key:
+            return []
+        hit = self._cached(key)
+        if hit is not None:
+            return hit
+        return list(await self.ainflight.do(key, lambda: self._asearch(query, key)))
+
+    async def asearch_many(self, queries: List[str]) -> List[Links]:
+        unique = list(dict.fromkeys(queries))
+        found = dict(zip(unique, await asyncio.gather(*(self.asearch(q) for q in unique))))
+        return [found[q] for q in queries]
+
+    async def _acall(self, fn: Callable, query: str) -> Links:
+        try:
+            return await fn(query) or []
+        except Exception as e:
+            print("Learn source error:", str(e))
+            return []
+
+    async def _asearch(self, query: str, key: str) -> Links:
+        t0 = time.monotonic()
+        tasks: List[asyncio.Task] = []
+        try:
+            while True:
+                elapsed = time.monotonic() - t0
+                finished = all(t.done() for t in tasks)
+                lists = [t.result() if t.done() else [] for t in tasks]
+                final = finished and len(tasks) == len(self.sources)
+                if final or elapsed >= self.deadline or len(merge_links(lists, self.max_results)) >= self.max_results:
+                    return self._finish(key, lists, len(tasks), final)
+                if len(tasks) < len(self.sources) and (finished or elapsed >= len(tasks) * self.hedge_delay):
+                    tasks.append(asyncio.ensure_future(self._acall(self.sources[len(tasks)], query)))
+                    continue
+                await asyncio.wait([t for t in tasks if not t.done()], timeout=self._next_wait(len(tasks), elapsed),
+                                   return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "hedged": self.hedged,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
@@ -0,0 +1,133 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+
+# Inverted BM25 index over a document's chunks.
+# Built incrementally alongside the chunk list (one add() per batch of
+# chunks), so row numbers match the VectorIndex. Postings are compact
+# array('I') row ids + array('H') term frequencies, scored with NumPy at query
+# time. Needs no network at all, which makes it both the offline retrieval
+# path and the lexical half of hybrid search (exact names, acronyms, datasets
+# that embeddings tend to blur). Saved indexes (index_files.py) reopen the
+# postings as read-only memory-mapped views; a term's arrays are copied the
+# first time a row is appended to it.
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what "
+    "when where which who why will with does do did can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word/number tokens without common stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def rrf(rankings: Sequence[Sequence], k: int = 60) -> List:
+    """Reciprocal-rank fusion of several best-first lists of hashable ids."""
+    fused: Dict = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+def _array(typecode: str, values) -> array:
+    out = array(typecode)
+    out.frombytes(np.ascontiguousarray(values).tobytes())
+    return out
+
+
+class BM25Index:
+    """Append-only inverted index with Okapi BM25 scoring."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = array("I")
+        self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @classmethod
+    def from_arrays(cls, terms: List[str], offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray,
+                    lengths: np.ndarray, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Index over saved postings (see arrays()); the arrays aren't copied."""
+        index = cls(k1, b)
+        rows, tfs, offsets = np.asarray(rows), np.asarray(tfs), np.asarray(offsets, dtype=np.int64)
+        index._postings = {
+            t: (rows[offsets[i] : offsets[i + 1]], tfs[offsets[i] : offsets[i + 1]]) for i, t in enumerate(terms)
+        }
+        index._lengths = np.asarray(lengths)
+        index._total = int(index._lengths.sum(dtype=np.int64))
+        return index
+
+    def arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(terms, offsets, rows, tfs, lengths): the postings flattened for saving;
+        term i's rows/tfs are rows[offsets[i]:offsets[i + 1]].
+        """
+        terms = list(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(self._postings[t][0]) for t in terms], dtype=np.uint64)
+        rows = np.zeros(int(offsets[-1]), dtype=np.uint32)
+        tfs = np.zeros(int(offsets[-1]), dtype=np.uint16)
+        for i, t in enumerate(terms):
+            r, tf = self._postings[t]
+            rows[offsets[i] : offsets[i + 1]] = np.frombuffer(r, dtype=np.uint32)
+            tfs[offsets[i] : offsets[i + 1]] = np.frombuffer(tf, dtype=np.uint16)
+        return terms, offsets, rows, tfs, np.array(self._lengths, dtype=np.uint32)
+
+    def add(self, texts: Iterable[str]):
+        """Index texts as the next rows (in order)."""
+        if not isinstance(self._lengths, array):
+            self._lengths = _array("I", self._lengths)
+        for text in texts:
+            row = len(self._lengths)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array("I"), array("H"))
+                elif not isinstance(posting[0], array):
+                    posting = self._postings[term] = (_array("I", posting[0]), _array("H", posting[1]))
+                posting[0].append(row)
+                posting[1].append(min(tf, 65535))
+            self._lengths.append(len(tokens))
+            self._total += len(tokens)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, rows) with a positive BM25 score, best first."""
+        n = len(self._lengths)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self._postings]
+        if n == 0 or k <= 0 or not terms:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(self._total / n, 1e-9))
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            rows_a, tfs_a = self._postings[term]
+            rows = np.frombuffer(rows_a, dtype=np.uint32)
+            tfs = np.frombuffer(tfs_a, dtype=np.uint16).astype(np.float32)
+            df = rows.shape[0]
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+        hits = np.flatnonzero(scores)
+        if k < hits.shape[0]:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return scores[hits], hits
+
+    def nbytes(self) -> int:
+        """Approximate private size: postings arrays + per-term dict overhead
+        (mapped postings live in the shared page cache and aren't counted).
+        """
+        def size(a) -> int:
+            return a.itemsize * len(a) if isinstance(a, array) else 0
+
+        return sum(size(r) + size(t) + 150 for r, t in self._postings.values()) + size(self._lengths)
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Process-wide latency/throughput metrics in the Prometheus text format.
+# Hot paths call timer("stage") / Counter.inc() / Histogram.observe(); when
+# METRICS=0 timer() hands back one shared no-op context manager and the
+# record functions return on the first line, so instrumented code costs a
+# flag check. Upstream HTTP calls are measured once in the shared clients
+# (http_client.py) rather than at every call site. Gauges that are cheap to
+# compute on demand (documents, chunks, cache sizes) come from collectors
+# run at scrape time.
+#
+# A trace ID (the request's X-Trace-Id header, or a fresh one) is kept with
+# the request (flask.g / the ASGI handler) and echoed in the response.
+
+ENABLED = os.getenv("METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Tuple[str, str, float]]]] = []
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, n: float = 1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_fmt_labels(self.labels, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = super().render()
+        for k, row in items:
+            cum = 0
+            for b, c in zip(self.buckets + ("+Inf",), row[:-1]):
+                cum += c
+                le = 'le="%s"' % ("+Inf" if b == "+Inf" else _num(b))
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {_num(cum)}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {_num(row[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {_num(cum)}")
+        return lines
+
+
+def collector(fn: Callable[[], Iterable[Tuple[str, str, float]]]):
+    """Register fn() -> [(name, help, value)] gauges computed at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for m in _registry:
+        lines.extend(m.render())
+    for fn in _collectors:
+        try:
+            for name, help, value in fn():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+        except Exception as e:
+            print("Metrics collector error:", str(e))
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("roorag_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+REQUEST_SECONDS = Histogram("roorag_request_seconds", "API request latency (to first byte for streams).", ("route", "status"))
+UPSTREAM_SECONDS = Histogram("roorag_upstream_seconds", "Upstream HTTP latency (to response headers).", ("service",))
+UPSTREAM_BYTES = Histogram("roorag_upstream_bytes", "Upstream HTTP body bytes.", ("service", "direction"), BYTE_BUCKETS)
+UPSTREAM_REQUESTS = Counter("roorag_upstream_requests_total", "Upstream HTTP requests.", ("service", "status"))
+CHUNKS_INDEXED = Counter("roorag_chunks_indexed_total", "Chunks added to document indexes.", ("source",))
+VECTORS_EMBEDDED = Counter("roorag_vectors_total", "Chunk vectors by outcome (ok = embedded, reused from the previous version, failed = empty).", ("outcome",))
+PAGES_EXTRACTED = Counter("roorag_pages_extracted_total", "Upload pages extracted.")
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, self.stage)
+
+
+_NOOP = nullcontext()
+
+
+def timer(stage: str):
+    """Context manager adding the block's duration to roorag_stage_seconds."""
+    return _Timer(stage) if ENABLED else _NOOP
+
+
+def upstream_service(url: str) -> str:
+    """Low-cardinality label for an outbound URL."""
+    if ":batchEmbedContents" in url:
+        return "embed"
+    if ":streamGenerateContent" in url:
+        return "generate_stream"
+    if ":generateContent" in url:
+        return "generate"
+    if "duckduckgo" in url:
+        return "ddg"
+    return "reference"
+
+
+def observe_upstream(url: str, seconds: float, status, sent: int, received: int):
+    if not ENABLED:
+        return
+    service = upstream_service(url)
+    UPSTREAM_SECONDS.observe(seconds, service)
+    UPSTREAM_BYTES.observe(sent, service, "sent")
+    UPSTREAM_BYTES.observe(received, service, "received")
+    UPSTREAM_REQUESTS.inc(service, str(status))
+
+
+def start_trace(incoming: Optional[str]) -> Optional[str]:
+    """This request's trace ID (client's if given, else a new one when enabled)."""
+    return (incoming or "").strip()[:64] or (uuid.uuid4().hex[:16] if ENABLED else None)
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator, List, Optional
+import fitz  # PyMuPDF
+
+# PDF text extraction off the request thread.
+# Uploads are spooled to a temp file (never held as one big bytes object) and
+# page ranges are parsed in a process pool, so large theses/proceedings use
+# several cores instead of holding the GIL. Pages are yielded in order as soon
+# as their range is done, letting chunking/embedding start early. Short PDFs
+# skip the pool entirely, since process hand-off costs more than it saves.
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker: text of pages [start, stop). Top-level so it can be pickled."""
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def is_noise_page(s: str) -> bool:
+    """IEEE Xplore style cover/permission page."""
+    low = (s or "").lower()
+    return ("ieee xplore" in low and ("downloaded" in low or "permission" in low or "personal use" in low))
+
+
+def filter_noise_pages(pages: Iterable[str]) -> Iterator[str]:
+    """Conservatively skip obvious cover/permission pages.
+    Only the first 1–2 pages are candidates, and if that would leave nothing
+    but blank pages, the skipped pages are yielded at the end after all.
+    """
+    skipped = []
+    any_text = False
+    for i, t in enumerate(pages):
+        if i < 2 and is_noise_page(t):
+            skipped.append(t)
+            continue
+        any_text = any_text or bool(t.strip())
+        yield t
+    # Fallback: if we filtered everything, keep all pages
+    if not any_text:
+        yield from skipped
+
+
+def spool_upload(stream: IO[bytes], suffix: str = "") -> str:
+    """Copy an upload stream to a temp file in blocks; caller deletes the path."""
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = stream.read(1024 * 1024)
+                if not block:
+                    break
+                out.write(block)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+class PdfExtractor:
+    """Ordered, page-streamed PDF text extraction on a process pool."""
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 8, min_parallel_pages: int = 24):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self.min_parallel_pages = min_parallel_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def iter_pages(self, path: str) -> Iterator[str]:
+        """Yield page texts in order."""
+        with fitz.open(path) as doc:
+            n = doc.page_count
+        if n < self.min_parallel_pages or self.max_workers < 2:
+            yield from _extract_range(path, 0, n)
+            return
+        ranges = [(s, min(s + self.pages_per_task, n)) for s in range(0, n, self.pages_per_task)]
+        next_page = 0
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(_extract_range, path, s, e) for s, e in ranges]
+            for fut, (s, e) in zip(futures, ranges):
+                pages = fut.result()
+                yield from pages
+                next_page = e
+        except Exception as e:
+            # Broken pool (killed worker, etc.): finish the rest in-process
+            print("PDF pool error, continuing serially:", str(e))
+            with self._lock:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            yield from _extract_range(path, next_page, n)
+
+    def extract_text(self, path: str) -> str:
+        """Whole-document text (no page filtering)."""
+        return "\n".join(self.iter_pages(path))
+
+
+_default: Optional[PdfExtractor] = None
+_default_lock = threading.Lock()
+
+
+def default_extractor() -> PdfExtractor:
+    """Process-wide extractor (pool is created on first large PDF)."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = PdfExtractor(
+                    max_workers=int(os.getenv("PDF_WORKERS", "0")) or None,
+                    pages_per_task=int(os.getenv("PDF_PAGES_PER_TASK", "8")),
+                )
+    return _default
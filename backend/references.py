@@ -0,0 +1,164 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
+import requests
+from http_client import shared_session
+from pdf_extract import default_extractor
+
+# Reference fetching for RAG augmentation.
+# URLs/DOIs are fetched concurrently on the shared pooled Session under an
+# overall deadline, so a few slow hosts cost one deadline instead of N
+# timeouts. Extracted text is cached per URL/DOI with a TTL and a byte budget;
+# failures are cached too (shorter TTL) so dead links aren't retried for every
+# paper that cites them. Stragglers past the deadline keep running in the
+# background and land in the cache for next time.
+
+
+def strip_html(html: str) -> str:
+    """Very naive HTML -> text cleaner for reference pages."""
+    try:
+        # very naive HTML to text
+        text = re.sub(r"<script[\s\S]*?</script>", " ", html, flags=re.I)
+        text = re.sub(r"<style[\s\S]*?</style>", " ", text, flags=re.I)
+        text = re.sub(r"<[^>]+>", " ", text)
+        text = re.sub(r"\s+", " ", text)
+        return text.strip()
+    except Exception:
+        return html
+
+
+def cache_key(url: str) -> str:
+    """DOIs are case-insensitive, so key doi.org links by the lowercased DOI."""
+    m = re.match(r"https?://(?:dx\.)?doi\.org/(.+)$", url.strip(), flags=re.I)
+    return f"doi:{m.group(1).lower()}" if m else url.strip()
+
+
+class TextCache:
+    """Thread-safe LRU of extracted text with TTLs and a total size cap."""
+
+    def __init__(self, max_chars: int = 50_000_000, ttl: float = 24 * 3600, negative_ttl: float = 600):
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires, text)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached text ("" for a cached failure) or None on miss/expiry."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, text: str):
+        if len(text) > self.max_chars:
+            return
+        ttl = self.ttl if text else self.negative_ttl
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (time.time() + ttl, text)
+            self._size += len(text)
+            while self._size > self.max_chars and self._items:
+                self._drop(next(iter(self._items)))
+
+    def _drop(self, key: str):
+        _, text = self._items.pop(key)
+        self._size -= len(text)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._items), "chars": self._size}
+
+
+class ReferenceFetcher:
+    """Concurrent, cached URL/DOI -> text extraction."""
+
+    def __init__(
+        self,
+        user_agent: str,
+        session: Optional[requests.Session] = None,
+        cache: Optional[TextCache] = None,
+        max_workers: int = 8,
+        timeout: float = 15,
+        max_bytes: int = 20 * 1024 * 1024,
+    ):
+        self.user_agent = user_agent
+        self.session = session or shared_session()
+        self.cache = cache if cache is not None else TextCache()
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refs")
+
+    def _download(self, url: str) -> str:
+        """Fetch and extract text from a reference URL.
+        - If it's a PDF, we spool it to disk and parse it with PyMuPDF.
+        - Else we pull the HTML and strip tags.
+        """
+        with self.session.get(
+            url, timeout=(5, self.timeout), headers={"User-Agent": self.user_agent}, stream=True
+        ) as r:
+            r.raise_for_status()
+            ctype = r.headers.get("Content-Type", "").lower()
+            if "pdf" in ctype or url.lower().endswith(".pdf"):
+                # Spool to disk and parse with the shared (process-pool) extractor
+                fd, path = tempfile.mkstemp(suffix=".pdf", prefix="ref-")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        self._copy_body(r, f.write)
+                    return default_extractor().extract_text(path)
+                finally:
+                    os.unlink(path)
+            body = bytearray()
+            self._copy_body(r, body.extend)
+            return strip_html(bytes(body).decode(r.encoding or "utf-8", errors="ignore"))
+
+    def _copy_body(self, r: requests.Response, write: Callable[[bytes], object]):
+        """Stream the response body into `write`, enforcing max_bytes."""
+        size = 0
+        for block in r.iter_content(64 * 1024):
+            size += len(block)
+            if size > self.max_bytes:
+                raise ValueError(f"response larger than {self.max_bytes} bytes")
+            write(block)
+
+    def fetch(self, url: str) -> str:
+        """Extracted text for one URL ("" on failure), via the cache."""
+        key = cache_key(url)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            text = self._download(url)
+        except Exception as e:
+            print("Ref fetch error:", url, str(e))
+            text = ""
+        self.cache.put(key, text)
+        return text
+
+    def fetch_many(
+        self, urls: List[str], deadline: float = 30, progress: Optional[Callable[[int], None]] = None
+    ) -> List[str]:
+        """Fetch all URLs at once; anything not back within `deadline` seconds is ""."""
+        futures = []
+        for u in urls:
+            fut = self._pool.submit(self.fetch, u)
+            if progress:
+                fut.add_done_callback(lambda _f: progress(1))
+            futures.append(fut)
+        wait(futures, timeout=deadline)
+        return [f.result() if f.done() else "" for f in futures]
@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from doc_store import Document
+
+# Incremental re-indexing of a revised upload (e.g. a new arXiv version).
+# Uploads are chunked with content-defined boundaries (chunker.content_spans),
+# so an edit only changes the chunks around it. Before anything is embedded,
+# each chunk's text hash is looked up among the previous version's chunks:
+# unchanged chunks take over their stored vector and only new or changed
+# chunks go to the embedding API. The counts give each upload's re-embed
+# ratio (1.0 for a first upload).
+
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class VectorReuse:
+    """Vectors for one upload's chunks, reusing `previous`' rows by chunk hash."""
+
+    def __init__(self, previous: Optional[Document] = None):
+        self.previous_id = previous.doc_id if previous is not None else None
+        self._rows: Dict[bytes, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self.chunks = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        if previous is not None:
+            with previous._lock:
+                matrix = previous.index.matrix
+                if matrix.size:
+                    # Failed embeddings are zero rows; those get another try
+                    live = np.flatnonzero(np.any(matrix != 0, axis=1))
+                    self._rows = {chunk_hash(previous.chunks[int(i)]): int(i) for i in live}
+                    self._matrix = matrix
+
+    def vectors(self, chunks: List[str], embed: Callable, progress=None) -> List[Any]:
+        """One vector per chunk (order kept); embed(texts, progress=...) is only
+        called for chunks the previous version didn't have.
+        """
+        rows = [self._rows.get(chunk_hash(c)) for c in chunks] if self._rows else [None] * len(chunks)
+        missing = [c for c, r in zip(chunks, rows) if r is None]
+        if progress and len(missing) < len(chunks):
+            progress(len(chunks) - len(missing))
+        fresh = iter(embed(missing, progress=progress) if missing else [])
+        out = [next(fresh) if r is None else self._matrix[r] for r in rows]
+        with self._lock:
+            self.chunks += len(chunks)
+            self.reused += len(chunks) - len(missing)
+        return out
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            embedded = self.chunks - self.reused
+            return {
+                "previous_doc_id": self.previous_id,
+                "chunks": self.chunks,
+                "reused": self.reused,
+                "embedded": embedded,
+                "re_embed_ratio": round(embedded / self.chunks, 4) if self.chunks else 0.0,
+            }
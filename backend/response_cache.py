@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Two-tier cache for finished model responses (summaries, answers).
+# Tier 1 is a small in-process LRU; tier 2 is SQLite (WAL mode, shared by
+# worker processes and kept across restarts). Keys hash everything that can
+# change the output: document fingerprint (content hash + index generation),
+# the question/prompt, model and generation config. A re-indexed document
+# therefore never hits stale entries; they simply age out of the LRU.
+# Each entry remembers how long it took to compute, so hits can report the
+# latency they saved. Like the embedding cache, writes keep a running row
+# estimate and only run COUNT(*) when it passes the cap or every ~1% of the cap
+# in writes; eviction frees 5% headroom.
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), ".cache", "responses.sqlite3")
+
+
+def response_key(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable key parts."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU in front of a SQLite LRU: key -> JSON value."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 5000, memory_entries: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (json, seconds)
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS resp ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, seconds REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS resp_last_used ON resp(last_used)")
+        self._recount_every = max(100, max_entries // 100)
+        self._rows = self._count()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Decoded value (a fresh copy, safe to mutate) or None on miss."""
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                self._mem.move_to_end(key)
+                self.memory_hits += 1
+            else:
+                row = self._db.execute("SELECT value, seconds FROM resp WHERE key=?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._db.execute("UPDATE resp SET last_used=? WHERE key=?", (time.time(), key))
+                item = (row[0], row[1])
+                self._remember(key, item)
+                self.disk_hits += 1
+            self.saved_seconds += item[1]
+        return json.loads(item[0])
+
+    def put(self, key: str, value: Any, seconds: float = 0.0):
+        """Store a value that took `seconds` to compute; evicts LRU rows past the cap."""
+        item = (json.dumps(value, ensure_ascii=False), float(seconds))
+        with self._lock:
+            # Rolled back (and not remembered) if any statement fails
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO resp(key, value, seconds, last_used) VALUES (?,?,?,?)",
+                    (key, item[0], item[1], time.time()),
+                )
+                self._rows += 1
+                self._writes += 1
+                if self._rows > self.max_entries or self._writes >= self._recount_every:
+                    self._trim_locked()
+            self._remember(key, item)
+
+    def _trim_locked(self):
+        """Recount; past the cap, delete LRU rows down to 95% of it."""
+        self._rows = self._count()
+        self._writes = 0
+        over = self._rows - self.max_entries
+        if over > 0:
+            over += self.max_entries // 20
+            self._rows -= self._db.execute(
+                "DELETE FROM resp WHERE key IN (SELECT key FROM resp ORDER BY last_used LIMIT ?)", (over,)
+            ).rowcount
+
+    def _remember(self, key: str, item: Tuple[str, float]):
+        self._mem[key] = item
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM resp").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for /api/health."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "memory_entries": len(self._mem),
+                "entries": self._count(),
+                "max_entries": self.max_entries,
+            }
+
+
+def response_cache_from_env() -> Optional[ResponseCache]:
+    """Build the cache from RESPONSE_CACHE_PATH / RESPONSE_CACHE_MAX_ENTRIES (0 disables)
+    and RESPONSE_CACHE_MEMORY_ENTRIES.
+    """
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    if max_entries <= 0:
+        return None
+    try:
+        return ResponseCache(
+            os.getenv("RESPONSE_CACHE_PATH", DEFAULT_PATH),
+            max_entries=max_entries,
+            memory_entries=int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "256")),
+        )
+    except Exception as e:
+        print("Response cache disabled:", str(e))
+        return None
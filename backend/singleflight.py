@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List
+
+# Request coalescing ("singleflight").
+# While a call for some key is in flight, identical calls don't start their
+# own upstream request: they wait for the first one and share its result (or
+# its exception). Once it finishes the key is forgotten, so this only merges
+# concurrent duplicates; caching finished results is the caller's business.
+# AsyncSingleFlight is the same for coroutines on one event loop (asgi.py).
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Any = None
+
+
+class SingleFlight:
+    """Run fn at most once at a time per key; concurrent callers share the outcome."""
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self._inflight: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.executions += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.calls - self.executions,
+                "in_flight": len(self._inflight),
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines. The shared call runs as its own task and
+    is cancelled only once every caller waiting on it has been cancelled
+    (e.g. all of their clients disconnected).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.cancelled = 0
+        # key -> [task, number of callers waiting on it]
+        self._inflight: Dict[str, List[Any]] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.executions += 1
+            entry = self._inflight[key] = [asyncio.ensure_future(fn()), 0]
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                self.cancelled += 1
+                task.cancel()
+
+    def _forget(self, key: str, entry: List[Any]):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._inflight),
+        }
@@ -1,8 +1,10 @@
 import os
 import json
 import re
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from http_client import shared_session
 
 # This module asks Gemini to summarize a big text into
 # fields our UI expects (summary, key_points, eli5, action_items).
@@ -11,6 +13,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+MODEL = "gemini-1.5-flash"
+ENDPOINT = f"{API_BASE}/models/{MODEL}:generateContent"
+GENERATION_CONFIG = {"temperature": 0.3, "responseMimeType": "application/json"}
 
 
 def _fallback_parse(text: str):
@@ -62,61 +68,206 @@ def _fallback_parse(text: str):
     return {"key_points": key_points, "action_items": action_items, "eli5": eli5, "summary": summary}
 
 
-def summarize_text(prompt_text: str):
-    """Ask Gemini for a strict-JSON summary of the given text."""
-    if not API_KEY:
-        return {"eli5": "Missing GEMINI_API_KEY.", "key_points": [], "action_items": [], "summary": ""}
+INSTRUCTION = (
+    "Return ONLY strict JSON with keys 'key_points' (array of concise strings), "
+    "'eli5' (string, 4-8 sentences), 'action_items' (array of imperative strings), and 'summary' "
+    "(string, 2-3 paragraphs, coherent and concise)."
+)
 
-    endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
 
+def _generate_json(instruction: str, prompt: str):
+    """One generateContent call. Returns the parsed summary dict; raises on API errors."""
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": API_KEY,
     }
 
-    instruction = (
-        "Return ONLY strict JSON with keys 'key_points' (array of concise strings), "
-        "'eli5' (string, 4-8 sentences), 'action_items' (array of imperative strings), and 'summary' "
-        "(string, 2-3 paragraphs, coherent and concise)."
-    )
-
     data = {
         "contents": [
             {
                 "parts": [
                     {"text": instruction},
-                    {"text": "Summarize the following research text. Output strict JSON only.\n\n" + prompt_text},
+                    {"text": prompt},
                 ]
             }
         ],
-        "generationConfig": {"temperature": 0.3, "responseMimeType": "application/json"},
+        "generationConfig": GENERATION_CONFIG,
+    }
+
+    response = shared_session().post(ENDPOINT, headers=headers, json=data, timeout=60)
+    response.raise_for_status()
+    result = response.json()
+
+    # Gemini returns text content; we expect JSON here
+    raw = result["candidates"][0]["content"]["parts"][0]["text"]
+
+    try:
+        parsed = json.loads(raw)
+        return {
+            "eli5": parsed.get("eli5") or "",
+            "key_points": parsed.get("key_points") or [],
+            "action_items": parsed.get("action_items") or [],
+            "summary": parsed.get("summary") or "",
+        }
+    except Exception:
+        # Fallback if the model didn't return valid JSON
+        return _fallback_parse(raw)
+
+
+def _error_result(message: str):
+    return {"eli5": message, "key_points": [], "action_items": [], "summary": ""}
+
+
+# -----------------------
+# Map-reduce for long papers
+# -----------------------
+# Papers longer than MAP_REDUCE_CHARS are split along section headings, each
+# section is summarized concurrently (map), and the partial summaries are
+# merged into the final JSON (reduce). If the partials are themselves too
+# long, they are reduced in groups first (hierarchical reduce).
+
+MAP_REDUCE_CHARS = int(os.getenv("SUMMARY_MAP_REDUCE_CHARS", "60000"))
+SECTION_CHARS = int(os.getenv("SUMMARY_SECTION_CHARS", "20000"))
+MAP_WORKERS = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# "1 Introduction", "2.3 Results", "IV. METHODS", "Abstract", "References" ...
+# Only the keywords ignore case: numbered headings need an upper-case numeral
+# and title, so lines like "i. e. the ..." or "c. the results" don't split.
+_HEADING_RE = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*|[IVXLC]+)\.?\s+[A-Z][^\n]{0,80}"
+    r"|(?i:abstract|introduction|related work|background|methods?|methodology|experiments?|results"
+    r"|discussion|conclusions?|references|bibliography|appendix)\b[^\n]{0,40})$",
+    flags=re.M,
+)
+
+
+def _split_sections(text: str, target: int = SECTION_CHARS):
+    """Split at heading lines, then pack neighbours up to ~target chars
+    (oversized sections are cut at paragraph/line breaks)."""
+    starts = [0] + [m.start() for m in _HEADING_RE.finditer(text) if m.start() > 0] + [len(text)]
+    pieces = []
+    for a, b in zip(starts, starts[1:]):
+        while b - a > target:
+            cut = text.rfind("\n", a + target // 2, a + target)
+            cut = cut if cut > a else a + target
+            pieces.append(text[a:cut])
+            a = cut
+        pieces.append(text[a:b])
+
+    sections, cur = [], ""
+    for p in pieces:
+        if cur and len(cur) + len(p) > target:
+            sections.append(cur)
+            cur = ""
+        cur += p
+    if cur.strip():
+        sections.append(cur)
+    return [s for s in sections if s.strip()]
+
+
+def _merge_partials(partials):
+    """Local reduce used when the reduce call fails: concatenate + dedupe."""
+    def _uniq(items):
+        return list(dict.fromkeys(i for i in items if i))
+
+    return {
+        "key_points": _uniq(k for p in partials for k in p["key_points"])[:12],
+        "action_items": _uniq(a for p in partials for a in p["action_items"])[:8],
+        "eli5": partials[0]["eli5"],
+        "summary": "\n\n".join(p["summary"] for p in partials if p["summary"])[:3000],
     }
 
+
+def _reduce(partials, pool, timings):
+    """Merge partial summaries into one, in groups if the input is too long."""
+    as_text = [json.dumps(p, ensure_ascii=False) for p in partials]
+    if sum(len(t) for t in as_text) > MAP_REDUCE_CHARS and len(partials) > 2:
+        groups, cur, size = [], [], 0
+        for p, t in zip(partials, as_text):
+            if cur and size + len(t) > MAP_REDUCE_CHARS // 2:
+                groups.append(cur)
+                cur, size = [], 0
+            cur.append(p)
+            size += len(t)
+        groups.append(cur)
+        timings["reduce_levels"] += 1
+        partials = list(pool.map(lambda g: _reduce(g, pool, timings) if len(g) > 1 else g[0], groups))
+        as_text = [json.dumps(p, ensure_ascii=False) for p in partials]
+
+    prompt = (
+        "Below are JSON summaries of consecutive sections of ONE research paper, in order. "
+        "Combine them into a single summary of the whole paper. Output strict JSON only.\n\n"
+        + "\n\n".join(f"Section {i+1}: {t}" for i, t in enumerate(as_text))
+    )
     try:
-        response = requests.post(endpoint, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-        result = response.json()
+        return _generate_json(INSTRUCTION, prompt)
+    except Exception as e:
+        print("Gemini reduce error:", str(e))
+        return _merge_partials(partials)
+
 
-        # Gemini returns text content; we expect JSON here
-        raw = result["candidates"][0]["content"]["parts"][0]["text"]
+def _summarize_map_reduce(prompt_text: str):
+    timings = {"mode": "map_reduce", "sections": 0, "failed_sections": 0, "reduce_levels": 1}
+    t0 = time.perf_counter()
+    sections = _split_sections(prompt_text)
+    timings["sections"] = len(sections)
+    timings["split_seconds"] = round(time.perf_counter() - t0, 3)
 
+    def _map(section):
         try:
-            parsed = json.loads(raw)
-            return {
-                "eli5": parsed.get("eli5") or "",
-                "key_points": parsed.get("key_points") or [],
-                "action_items": parsed.get("action_items") or [],
-                "summary": parsed.get("summary") or "",
-            }
-        except Exception:
-            # Fallback if the model didn't return valid JSON
-            return _fallback_parse(raw)
+            return _generate_json(
+                INSTRUCTION,
+                "Summarize the following section of a longer research paper. Output strict JSON only.\n\n" + section,
+            )
+        except Exception as e:
+            print("Gemini map error:", str(e))
+            return None
+
+    with ThreadPoolExecutor(max_workers=MAP_WORKERS, thread_name_prefix="summary") as pool:
+        t1 = time.perf_counter()
+        partials = [p for p in pool.map(_map, sections) if p]
+        timings["map_seconds"] = round(time.perf_counter() - t1, 3)
+        timings["failed_sections"] = len(sections) - len(partials)
+        if not partials:
+            result = _error_result("Error summarizing.")
+        else:
+            t2 = time.perf_counter()
+            result = _reduce(partials, pool, timings) if len(partials) > 1 else partials[0]
+            timings["reduce_seconds"] = round(time.perf_counter() - t2, 3)
+    timings["total_seconds"] = round(time.perf_counter() - t0, 3)
+    print("Map-reduce summary timings:", timings)
+    result["summary_timings"] = timings
+    return result
+
 
+def summary_config():
+    """Everything besides the input text that shapes a summary (for cache keys)."""
+    return {
+        "model": MODEL,
+        "instruction": INSTRUCTION,
+        "generation": GENERATION_CONFIG,
+        "map_reduce_chars": MAP_REDUCE_CHARS,
+        "section_chars": SECTION_CHARS,
+    }
+
+
+def summarize_text(prompt_text: str):
+    """Ask Gemini for a strict-JSON summary of the given text.
+    Short texts go in one call; long ones use section map-reduce.
+    """
+    if not API_KEY:
+        return _error_result("Missing GEMINI_API_KEY.")
+
+    if len(prompt_text) > MAP_REDUCE_CHARS:
+        return _summarize_map_reduce(prompt_text)
+
+    t0 = time.perf_counter()
+    try:
+        result = _generate_json(
+            INSTRUCTION, "Summarize the following research text. Output strict JSON only.\n\n" + prompt_text
+        )
     except Exception as e:
         print("Gemini API error:", str(e))
-        return {
-            "eli5": "Error summarizing.",
-            "key_points": [],
-            "action_items": [],
-            "summary": "",
-        }
\ No newline at end of file
+        return _error_result("Error summarizing.")
+    result["summary_timings"] = {"mode": "single", "total_seconds": round(time.perf_counter() - t0, 3)}
+    return result
@@ -0,0 +1,66 @@
+"""IVF background training and the workspace index cache.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ann_index import ANN_MIN_ROWS, IVFIndex  # noqa: E402
+from doc_store import Document, DocumentStore  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+
+
+def unit_rows(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_exact_until_trained_then_follows_appends():
+    index = VectorIndex(ann=IVFIndex(nlist=16, min_rows=2000))
+    index.add(unit_rows(1500))
+    assert index.ann._trainer is None
+    index.add(unit_rows(1000, seed=1))
+    # Training runs in the background; the add itself doesn't wait for it
+    trainer = index.ann._trainer
+    assert trainer is not None
+    trainer.join()
+    assert index.ann.ready and index.ann.trained_rows == 2500
+
+    # Rows appended after training are filed under their nearest centroid
+    for seed in range(2, 6):
+        index.add(unit_rows(700, seed=seed))
+    assert len(index.ann) == len(index) == 5300
+    expected = np.argmax(index.matrix @ index.ann.centroids.T, axis=1)
+    np.testing.assert_array_equal(index.ann._assign[: len(index)], expected)
+
+    q = unit_rows(1, seed=9)[0]
+    index.ann.nprobe = 16  # every list: same result as exact search
+    np.testing.assert_array_equal(index.search(q, 10)[1], index.search(q, 10, exact=True)[1])
+
+
+def workspace_doc(rows: int, seed: int) -> Document:
+    doc = Document()
+    doc.add_text("alpha beta gamma", [(0, 16)] * rows, "paper", unit_rows(rows, seed=seed))
+    return doc
+
+
+def test_workspace_survives_swapped_copy_but_not_new_version():
+    store = DocumentStore()
+    a, b = workspace_doc(ANN_MIN_ROWS // 2, 0), workspace_doc(ANN_MIN_ROWS // 2, 1)
+    store.put(a)
+    store.put(b)
+    ws = store.workspace([a, b])
+    assert ws is not None
+
+    # Same version in a new object (like the mapped copy after persisting)
+    copy = workspace_doc(ANN_MIN_ROWS // 2, 1)
+    copy.doc_id, copy.created = b.doc_id, b.created
+    assert store.workspace([a, copy]) is ws
+    assert ws.docs[1] is copy
+
+    # A revision under the same doc_id is a different version
+    revised = workspace_doc(ANN_MIN_ROWS // 2, 2)
+    revised.doc_id, revised.created = b.doc_id, b.created + 60
+    assert store.workspace([a, revised]) is not ws
@@ -0,0 +1,58 @@
+"""SQLite-backed caches: size cap and failed writes.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from embedding_cache import EmbeddingCache  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+
+def test_embedding_cache_stays_under_cap(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), max_entries=200)
+    for i in range(0, 1000, 10):
+        cache.put_many({f"k{j}": [float(j), 1.0] for j in range(i, i + 10)})
+        assert cache.stats()["entries"] <= 200
+    assert cache.evictions == 1000 - cache.stats()["entries"]
+    # The newest rows survive
+    assert cache.get_many(["k999", "k0"]) == {"k999": [999.0, 1.0]}
+
+
+def test_embedding_cache_rolls_back_failed_writes(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), max_entries=200)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(cache, "_trim_locked", fail)
+    with pytest.raises(RuntimeError):
+        cache.put_many({f"k{j}": [1.0] for j in range(150)})
+    assert not cache._db.in_transaction
+    assert cache.stats()["entries"] == 0
+
+
+def test_response_cache_stays_under_cap(tmp_path):
+    cache = ResponseCache(str(tmp_path / "resp.sqlite3"), max_entries=150, memory_entries=4)
+    for i in range(600):
+        cache.put(f"k{i}", {"answer": i})
+        assert cache.stats()["entries"] <= 150
+    assert cache.get("k599") == {"answer": 599}
+    assert cache.get("k0") is None
+
+
+def test_response_cache_rolls_back_failed_writes(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "resp.sqlite3"), max_entries=150)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(cache, "_trim_locked", fail)
+    cache._writes = cache._recount_every
+    with pytest.raises(RuntimeError):
+        cache.put("k", {"answer": 1})
+    assert not cache._db.in_transaction
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,44 @@
+"""DocumentStore: latest upload and idle eviction.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from doc_store import Document, DocumentStore  # noqa: E402
+
+
+def test_latest_is_the_last_upload_not_the_last_used():
+    store = DocumentStore()
+    first, second = Document(), Document()
+    store.put(first, uploaded=True)
+    store.put(second, uploaded=True)
+    store.get(first.doc_id)
+    assert store.latest() is second
+    # Reopened from disk / swapped copies don't count as uploads
+    store.put(Document())
+    assert store.latest() is second
+
+
+def test_latest_reloads_an_evicted_upload():
+    saved = {}
+    store = DocumentStore(idle_ttl=60, loader=saved.get)
+    doc = Document()
+    saved[doc.doc_id] = doc
+    store.put(doc, uploaded=True)
+    doc.last_access = time.time() - 120
+    assert store.stats()["documents"] == 0
+    assert store.latest() is doc
+
+
+def test_idle_documents_are_dropped_on_get():
+    store = DocumentStore(idle_ttl=60)
+    idle, busy = Document(), Document()
+    store.put(idle)
+    store.put(busy)
+    idle.last_access = time.time() - 120
+    assert store.get(busy.doc_id) is busy
+    assert store.stats()["documents"] == 1
+    assert store.get(idle.doc_id) is None
@@ -0,0 +1,83 @@
+"""EmbeddingEngine against the local stub (bench/stub_server.py).
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+import stub_server  # noqa: E402
+from embeddings import EmbeddingEngine  # noqa: E402
+
+DIM = 8
+
+
+def engine(srv, **kw) -> EmbeddingEngine:
+    kw.setdefault("backoff", 0.01)
+    return EmbeddingEngine(
+        "stub", base_url=f"http://127.0.0.1:{srv.server_port}/v1beta", session=requests.Session(), **kw
+    )
+
+
+@pytest.fixture
+def stub():
+    srvs = []
+
+    def make(**kw):
+        srvs.append(stub_server.start(stub_server.StubConfig(dim=DIM, **kw)))
+        return srvs[-1]
+
+    yield make
+    for srv in srvs:
+        srv.shutdown()
+        srv.server_close()
+
+
+def texts(n: int):
+    return [f"chunk number {i}" for i in range(n)]
+
+
+def test_batches_and_order(stub):
+    srv = stub(latency={"embed": 0.01})
+    inputs = texts(23)
+    vecs = engine(srv, batch_size=5, max_workers=3).embed(inputs)
+    assert sorted(srv.stats()["batch_sizes"]["embed"]) == [3, 5, 5, 5, 5]
+    # Vectors line up with their inputs whatever order the batches finished in
+    assert vecs == [stub_server.embed_vector(t, DIM) for t in inputs]
+
+
+def test_concurrency_is_bounded(stub):
+    srv = stub(latency={"embed": 0.05})
+    engine(srv, batch_size=2, max_workers=3).embed(texts(40))
+    stats = srv.stats()
+    assert stats["requests"]["embed"] == 20
+    assert stats["max_inflight"]["embed"] == 3
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_transient_errors(stub, status):
+    srv = stub(script={"embed": [status, status]})
+    inputs = texts(4)
+    vecs = engine(srv, batch_size=4, max_workers=1).embed(inputs)
+    assert vecs == [stub_server.embed_vector(t, DIM) for t in inputs]
+    stats = srv.stats()["requests"]
+    assert stats[f"embed_{status}"] == 2
+    assert stats["embed"] == 3
+
+
+def test_gives_up_with_empty_vectors(stub):
+    srv = stub(script={"embed": [503, 503]})
+    vecs = engine(srv, batch_size=2, max_workers=1, max_retries=1).embed(texts(4))
+    # First batch fails twice (no retries left) -> []; the second succeeds
+    assert vecs[:2] == [[], []]
+    assert vecs[2:] == [stub_server.embed_vector(t, DIM) for t in texts(4)[2:]]
+
+
+def test_no_retry_on_client_error(stub):
+    srv = stub(script={"embed": [400]})
+    assert engine(srv, batch_size=4, max_workers=1).embed(texts(2)) == [[], []]
+    assert srv.stats()["requests"]["embed"] == 1
@@ -0,0 +1,97 @@
+"""Documents saved by index_files and mapped back keep their chunk spans.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from context_budget import Candidate, budget_context  # noqa: E402
+from doc_store import Document  # noqa: E402
+from index_files import load_document, save_document  # noqa: E402
+
+PAPER = " ".join(f"Sentence {i} about Schrödinger’s café and the résumé of model {i}." for i in range(60))
+REF = "A referenced paper — with naïve Bayes baselines and a few more words to chunk."
+
+
+def windows(text: str, size: int = 300, step: int = 250):
+    return [(s, min(s + size, len(text))) for s in range(0, len(text), step)]
+
+
+def build() -> Document:
+    doc = Document()
+    rng = np.random.default_rng(0)
+    for text, label in ((PAPER, "paper"), (REF, "ref:1")):
+        spans = windows(text)
+        doc.add_text(text, spans, label, rng.standard_normal((len(spans), 4)).astype(np.float32))
+    return doc
+
+
+def context(doc: Document, rows):
+    """Candidates the way app._assemble_context builds them, then budgeted."""
+    intro = doc.intro(200)
+    span = doc.spans([], intro=len(intro))[0]
+    cands = [Candidate(intro, "paper:intro", 0, (0, span[0]) if span else None, *(span[1:] if span else (0, 0)))]
+    for i in rows:
+        texts, ms = doc.get([i])
+        b, s, e = doc.spans([i])[0]
+        cands.append(Candidate(texts[0], ms[0]["source"], len(cands), (0, b), s, e))
+    return budget_context(cands, 10_000, lambda d, b, s, e: doc.span_text(b, s, e))
+
+
+def test_round_trip(tmp_path):
+    doc = build()
+    save_document(doc, str(tmp_path))
+    mapped = load_document(doc.doc_id, str(tmp_path))
+    assert list(mapped.chunks) == list(doc.chunks)
+    assert [m["source"] for m in mapped.metas] == [m["source"] for m in doc.metas]
+    assert mapped.paper_text == doc.paper_text
+    assert mapped.intro(200) == doc.intro(200)
+    np.testing.assert_array_equal(mapped.index.matrix, doc.index.matrix)
+
+
+def test_budgeter_merges_spans_of_persisted_document(tmp_path):
+    doc = build()
+    save_document(doc, str(tmp_path))
+    mapped = load_document(doc.doc_id, str(tmp_path))
+    rows = [2, 0, 1, len(doc) - 1]
+    assert all(span is not None for span in mapped.spans(rows, intro=200))
+
+    packed, report = context(doc, rows)
+    mapped_packed, mapped_report = context(mapped, rows)
+    # Intro + chunks 0-2 overlap into one span; the reference stays separate
+    assert report["merged"] == 3
+    assert mapped_report == report
+    assert [c.text for c in mapped_packed] == [c.text for c in packed]
+    assert mapped_packed[0].text == PAPER[:windows(PAPER)[2][1]]
+
+
+def test_bm25_is_persisted(tmp_path):
+    doc = build()
+    save_document(doc, str(tmp_path))
+    mapped = load_document(doc.doc_id, str(tmp_path))
+    assert len(mapped.lexical) == len(doc)
+    for query in ("model 7 résumé", "naïve Bayes baselines", "nothing matches"):
+        scores, rows = doc.lexical_search(query, 5)
+        mapped_scores, mapped_rows = mapped.lexical_search(query, 5)
+        np.testing.assert_array_equal(mapped_rows, rows)
+        np.testing.assert_allclose(mapped_scores, scores)
+    # Appending to a mapped document copies the postings it touches
+    mapped.add_text("naïve Bayes again", [(0, 17)], "ref:2", np.ones((1, 4), dtype=np.float32))
+    assert mapped.lexical_search("naïve Bayes", 5)[1][0] == len(doc)
+
+
+def test_saves_write_new_versions(tmp_path):
+    doc = build()
+    save_document(doc, str(tmp_path))
+    first = load_document(doc.doc_id, str(tmp_path))
+    doc.add_text("A later reference.", [(0, 18)], "ref:2", np.ones((1, 4), dtype=np.float32))
+    # The first version is still mapped by `first` while the next one is saved
+    save_document(doc, str(tmp_path))
+    second = load_document(doc.doc_id, str(tmp_path))
+    assert len(second) == len(first) + 1
+    assert list(first.chunks) == list(doc.chunks)[:-1]
+    names = os.listdir(tmp_path / doc.doc_id)
+    assert len(names) == 1 and names[0].startswith("v-")
@@ -0,0 +1,23 @@
+"""Section splitting for map-reduce summaries.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from summarize import _HEADING_RE  # noqa: E402
+
+
+@pytest.mark.parametrize("line", ["1 Introduction", "2.3 Results", "IV. METHODS", "III Related Work",
+                                  "Abstract", "REFERENCES", "appendix A"])
+def test_headings(line):
+    assert _HEADING_RE.match(line)
+
+
+@pytest.mark.parametrize("line", ["i. e. the method converges", "c. the results were mixed", "a. the results",
+                                  "v. experiments were run twice"])
+def test_enumerations_are_not_headings(line):
+    assert not _HEADING_RE.match(line)
@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Optional, Sequence, Tuple
+from ann_index import ANN_MIN_ROWS, IVFIndex
+
+# Dense embedding index used by the RAG chat.
+# Vectors are L2-normalized once on insert and stored as rows of a contiguous
+# float32 matrix, so a query is a single matrix-vector product (cosine ==
+# dot product on unit vectors) followed by an argpartition top-k.
+# Failed embeddings ([]) and vectors of the wrong size are kept as zero rows so
+# row numbers always line up with the chunk list; they simply score 0.
+# Past ANN_MIN_ROWS rows, search goes through an IVF index (ann_index.py)
+# that trains in the background (searches stay exact until it is ready) and
+# follows appends; search(exact=True) bypasses it.
+
+
+class VectorIndex:
+    """Growable, pre-normalized float32 matrix with top-k cosine search."""
+
+    def __init__(self, dim: int = 0, capacity: int = 256, ann: Optional[IVFIndex] = None):
+        self.dim = dim
+        self._n = 0
+        self._mat = np.zeros((capacity, dim), dtype=np.float32) if dim else None
+        self.ann = ann if ann is not None else (IVFIndex() if ANN_MIN_ROWS > 0 else None)
+
+    @classmethod
+    def from_matrix(cls, mat: Optional[np.ndarray], count: int = 0) -> "VectorIndex":
+        """Wrap an existing (possibly read-only, memory-mapped) normalized matrix
+        without copying. The first add() copies it into a private growable buffer.
+        """
+        idx = cls()
+        if mat is None:
+            idx._n = count
+            return idx
+        idx.dim = mat.shape[1]
+        idx._n = mat.shape[0]
+        idx._mat = mat
+        return idx
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the filled rows (no copy)."""
+        if self._mat is None:
+            return np.zeros((self._n, self.dim), dtype=np.float32)
+        return self._mat[: self._n]
+
+    def _reserve(self, extra: int):
+        """Grow the backing buffer geometrically so appends stay amortized O(1)."""
+        need = self._n + extra
+        cap = self._mat.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 256)
+        grown = np.zeros((new_cap, self.dim), dtype=np.float32)
+        grown[: self._n] = self._mat[: self._n]
+        self._mat = grown
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        """Append one row per vector (in order). Empty vectors become zero rows."""
+        if len(vectors) == 0:
+            return
+        if self._mat is None:
+            # Dimension is taken from the first real embedding we see
+            first = next((v for v in vectors if v is not None and len(v)), None)
+            if first is None:
+                self._n += len(vectors)
+                return
+            self.dim = len(first)
+            self._mat = np.zeros((max(256, self._n + len(vectors)), self.dim), dtype=np.float32)
+        self._reserve(len(vectors))
+        block = self._mat[self._n : self._n + len(vectors)]
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2 and vectors.shape[1] == self.dim:
+            block[:] = vectors
+        else:
+            for row, v in zip(block, vectors):
+                if v is not None and len(v) == self.dim:
+                    row[:] = v
+                else:
+                    row[:] = 0.0
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.divide(block, norms, out=block, where=norms > 0)
+        self._n += len(vectors)
+        if self.ann is not None and self._n >= self.ann.min_rows:
+            self.ann.sync(self.matrix)
+
+    def _usable(self, qvec: Sequence[float]) -> bool:
+        return self._mat is not None and qvec is not None and len(qvec) == self.dim and bool(np.any(qvec))
+
+    def scores(self, qvec: Sequence[float]) -> np.ndarray:
+        """Cosine score of the query against every row (zeros if unusable)."""
+        if not self._usable(qvec):
+            return np.zeros(self._n, dtype=np.float32)
+        q = np.asarray(qvec, dtype=np.float32)
+        return self.matrix @ (q / np.linalg.norm(q))
+
+    def search(self, qvec: Sequence[float], k: int, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, row_indices) of the k best rows, best first.
+        Approximate (IVF) on large indexes once the IVF lists are trained,
+        unless exact=True.
+        """
+        if not exact and self.ann is not None and self._n >= self.ann.min_rows and k > 0 and self._usable(qvec):
+            self.ann.sync(self.matrix)
+            if self.ann.ready:
+                q = np.asarray(qvec, dtype=np.float32)
+                return self.ann.search(self.matrix, q / np.linalg.norm(q), k)
+        scores = self.scores(qvec)
+        n = scores.shape[0]
+        if n == 0 or k <= 0:
+            return scores[:0], np.zeros(0, dtype=np.int64)
+        if k < n:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], top
+
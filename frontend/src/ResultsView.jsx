@@ -54,27 +54,51 @@ export default function ResultsView({ data }) {
     URL.revokeObjectURL(url);
   };
 
-  // Chat submit: POST question to backend /api/ask and append reply
+  // Chat submit: POST question to backend /api/ask/stream and grow the reply
+  // as server-sent events arrive (sources first, then answer tokens)
   const handleSend = async (e) => {
     e?.preventDefault?.();
     const text = input.trim();
     if (!text) return;
-    const userMsg = { role: "user", content: text, ts: Date.now() };
-    setMessages((m) => [...m, userMsg]);
+    const ts = Date.now();
+    const userMsg = { role: "user", content: text, ts };
+    const updateReply = (patch) =>
+      setMessages((m) => m.map((msg) => (msg.role === "assistant" && msg.ts === ts ? { ...msg, ...patch(msg) } : msg)));
+    setMessages((m) => [...m, userMsg, { role: "assistant", content: "", sources: [], ts }]);
     setInput("");
     try {
-      const res = await fetch(`${API_BASE}/api/ask`, {
+      const res = await fetch(`${API_BASE}/api/ask/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ question: text }),
+        body: JSON.stringify({ question: text, doc_id: data?.doc_id }),
       });
-      const payload = await res.json();
-      const content = payload?.answer || payload?.error || "No answer.";
-      const assistantMsg = { role: "assistant", content, ts: Date.now() };
-      setMessages((m) => [...m, assistantMsg]);
+      if (!res.ok || !res.body) {
+        const payload = await res.json().catch(() => ({}));
+        updateReply(() => ({ content: payload?.error || "No answer." }));
+        return;
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        const events = buf.split("\n\n");
+        buf = events.pop();
+        for (const raw of events) {
+          const event = (raw.match(/^event: (.*)$/m) || [])[1];
+          const dataLine = (raw.match(/^data: (.*)$/m) || [])[1];
+          if (!event || dataLine === undefined) continue;
+          const payload = JSON.parse(dataLine);
+          if (event === "sources") updateReply(() => ({ sources: payload }));
+          if (event === "token") updateReply((msg) => ({ content: msg.content + payload.text }));
+          if (event === "error") updateReply(() => ({ content: payload.error }));
+        }
+      }
+      updateReply((msg) => ({ content: msg.content || "No answer." }));
     } catch (err) {
-      const assistantMsg = { role: "assistant", content: "Error contacting AI.", ts: Date.now() };
-      setMessages((m) => [...m, assistantMsg]);
+      updateReply(() => ({ content: "Error contacting AI." }));
     }
   };
 
@@ -84,22 +108,31 @@ export default function ResultsView({ data }) {
     return String(firstSentence).slice(0, 120);
   }, [summary, key_points]);
 
-  // Trigger backend learn-more search when Learn tab (main) or sidebar Learn is active
+  // One Learn More search per key point (or the topic when there are none);
+  // at most 20, the backend default LEARN_BATCH_MAX
+  const learnQueries = useMemo(
+    () => (key_points.length ? key_points.map((p) => String(p).slice(0, 120)) : [learnTopic]).slice(0, 20),
+    [data?.key_points, learnTopic]
+  );
+
+  // Trigger backend learn-more search when Learn tab (main) or sidebar Learn is active.
+  // All queries go out in a single /api/learn/batch call (searched concurrently there).
   useEffect(() => {
     if (!(tab === "learn" || sidebarTab === "learn")) return;
-    const q = String(learnTopic || "").trim();
-    if (!q) return;
+    const queries = learnQueries.map((q) => q.trim()).filter(Boolean);
+    if (!queries.length) return;
     let aborted = false;
     setLearnResults((s) => ({ ...s, loading: true, error: null }));
-    fetch(`${API_BASE}/api/learn`, {
+    fetch(`${API_BASE}/api/learn/batch`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ q }),
+      body: JSON.stringify({ queries }),
     })
       .then((r) => r.json())
       .then((data) => {
         if (aborted) return;
-        const items = Array.isArray(data?.links) ? data.links : [];
+        const results = Array.isArray(data?.results) ? data.results : [];
+        const items = results.filter((g) => Array.isArray(g?.links) && g.links.length);
         setLearnResults({ loading: false, items, error: null });
       })
       .catch(() => {
@@ -109,7 +142,7 @@ export default function ResultsView({ data }) {
     return () => {
       aborted = true;
     };
-  }, [tab, sidebarTab, learnTopic]);
+  }, [tab, sidebarTab, learnQueries]);
 
   // Fallback static search links (if backend returns nothing)
   const fallbackLearnLinks = useMemo(() => {
@@ -121,6 +154,24 @@ export default function ResultsView({ data }) {
       { title: `Stack Overflow: ${learnTopic}`, url: `https://stackoverflow.com/search?q=${q}` },
     ];
   }, [learnTopic]);
+
+  // Learn More links grouped by key point, or the static fallbacks
+  const renderLearnLinks = (listStyle) => {
+    const linkItem = (l, i) => (
+      <li key={i}>
+        <a href={l.url} target="_blank" rel="noreferrer">
+          {l.title || l.label || l.url}
+        </a>
+      </li>
+    );
+    if (!learnResults.items.length) return <ul style={listStyle}>{fallbackLearnLinks.map(linkItem)}</ul>;
+    return learnResults.items.map((g, i) => (
+      <div key={i} style={{ marginBottom: 10 }}>
+        <div style={{ fontWeight: 600, marginBottom: 4 }}>{g.q}</div>
+        <ul style={listStyle}>{g.links.map(linkItem)}</ul>
+      </div>
+    ));
+  };
 
   // Right-side insights sidebar (shown while chatting)
   const Sidebar = () => (
@@ -235,15 +286,7 @@ export default function ResultsView({ data }) {
               {learnResults.loading && (
                 <div style={{ color: "#94a3b8", marginBottom: 6 }}>Searching…</div>
               )}
-              <ul style={{ margin: 0, paddingLeft: 18 }}>
-                {(learnResults.items.length ? learnResults.items : fallbackLearnLinks).map((l, i) => (
-                  <li key={i}>
-                    <a href={l.url} target="_blank" rel="noreferrer">
-                      {l.title || l.label || l.url}
-                    </a>
-                  </li>
-                ))}
-              </ul>
+              {renderLearnLinks({ margin: 0, paddingLeft: 18 })}
             </div>
           )}
         </div>
@@ -333,15 +376,7 @@ export default function ResultsView({ data }) {
               {learnResults.loading && (
                 <div style={{ color: "#94a3b8", marginBottom: 8 }}>Searching…</div>
               )}
-              <ul>
-                {(learnResults.items.length ? learnResults.items : fallbackLearnLinks).map((l, i) => (
-                  <li key={i}>
-                    <a href={l.url} target="_blank" rel="noreferrer">
-                      {l.title || l.label || l.url}
-                    </a>
-                  </li>
-                ))}
-              </ul>
+              {renderLearnLinks(undefined)}
             </section>
           )}
 
@@ -407,6 +442,11 @@ export default function ResultsView({ data }) {
                       }}
                     >
                       {m.content}
+                      {m.role === "assistant" && m.sources?.length > 0 && (
+                        <div style={{ marginTop: 6, fontSize: 12, color: "#94a3b8" }}>
+                          Sources: {m.sources.map((s, i) => `[S${i + 1}] ${s}`).join(" · ")}
+                        </div>
+                      )}
                     </div>
                   </div>
                 ))}